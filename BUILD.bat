@@ -52,7 +52,7 @@ echo   Gerando executável...
 echo ========================================
 echo.
 
-pyinstaller --onefile --windowed --collect-all chardet --icon=image.ico --add-data "splash.png;." TEXT_MAPPER_PRO_1.5.0.py
+pyinstaller --onefile --windowed --collect-all chardet --hidden-import difflib --icon=image.ico --add-data "splash.png;." TEXT_MAPPER_PRO_1.5.0.py
 
 if errorlevel 1 (
     echo.
@@ -1,13 +1,80 @@
+import time
+_T_MODULE = time.perf_counter()   # início da importação (tempos de inicialização)
+
 import os
+import re
+import bisect
+import codecs
+import fnmatch
+import hashlib
+import importlib
+import itertools
+import json
+import mmap
+import struct
 import sys
 import threading
-import webbrowser
-from pathlib import Path
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from datetime import datetime
-import chardet
-import difflib
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  IMPORTAÇÕES SOB DEMANDA (início mais rápido)
+# ─────────────────────────────────────────────────────────────────────────────
+class LazyModule:
+    """Representa um módulo que só é importado no primeiro acesso a um atributo.
+
+    Nesse momento o nome global passa a apontar para o módulo real, então
+    os acessos seguintes não passam mais por aqui.
+    """
+
+    def __init__(self, name, alias=None):
+        self._name  = name
+        self._alias = alias or name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+# Módulos pesados da biblioteca padrão (sqlite3, zipfile, tarfile, http.server,
+# concurrent.futures...) são importados dentro das funções que os usam.
+# chardet e difflib, usados em vários pontos, ficam aqui; o BUILD.bat os
+# declara (--collect-all chardet, --hidden-import difflib), já que o
+# PyInstaller não enxerga importlib.
+chardet     = LazyModule("chardet")          # ~40 ms: só na 1ª detecção de encoding
+difflib     = LazyModule("difflib")
+
+
+class StartupTimer:
+    """Marcos de tempo da inicialização; ativo com --startup-timing ou TMP_STARTUP_TIMING=1."""
+
+    def __init__(self, enabled, t0):
+        self.enabled = enabled
+        self.t0      = t0
+        self.marks   = []
+
+    def mark(self, label):
+        if self.enabled:
+            self.marks.append((label, time.perf_counter()))
+
+    def lines(self):
+        out, prev = [], self.t0
+        for label, t in self.marks:
+            out.append(f"{label:<34s} +{(t - prev)*1000:7.1f} ms  (total {(t - self.t0)*1000:7.1f} ms)")
+            prev = t
+        return out
+
+
+STARTUP = StartupTimer("--startup-timing" in sys.argv or bool(os.environ.get("TMP_STARTUP_TIMING")),
+                       _T_MODULE)
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  PALETA DE CORES
@@ -79,11 +146,3532 @@ LIGHT = {
 }
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+#  INSTRUMENTAÇÃO (tempos por fase, contadores e perfil opcional)
+# ─────────────────────────────────────────────────────────────────────────────
+PHASES = [
+    ("scan",   "Varredura de pastas"),
+    ("hash",   "Agrupamento por conteúdo"),
+    ("load",   "Carga de dicionários sob demanda"),
+    ("read",   "Leitura de disco"),
+    ("detect", "Detecção de encoding (chardet)"),
+    ("decode", "Decodificação"),
+    ("ignore", "Filtro de prefixos"),
+    ("align",  "Realinhamento posicional"),
+    ("lookup", "Busca exata"),
+    ("fuzzy",  "Similaridade (difflib)"),
+    ("index",  "Montagem dos dicionários"),
+    ("write",  "Escrita"),
+]
+PHASE_LABELS = dict(PHASES)
+
+
+class RunStats:
+    """Tempos por fase e contadores, agregados por arquivo e pela execução inteira.
+
+    Os tempos usam time.perf_counter e são somados em dicionários simples;
+    fases por linha (busca exata, prefixos) são acumuladas em variáveis
+    locais no laço e registradas uma vez por arquivo com add().
+
+    Os campos "ao vivo" (arquivo atual, linha atual, bytes concluídos) são
+    escritos só pela thread de trabalho e lidos pela UI num timer.
+    """
+
+    def __init__(self, name):
+        self.name     = name
+        self.phases   = {key: 0.0 for key, _ in PHASES}
+        self.counters = {}
+        self.per_file = {}          # {rel: {"total": s, fase: s, ...}}
+        self.elapsed  = 0.0
+        self._t0      = time.perf_counter()
+        self._file    = None
+        self._file_t0 = 0.0
+        # Ao vivo
+        self.total_files  = 0
+        self.total_bytes  = 0
+        self.done_bytes   = 0
+        self.current      = None
+        self.current_line = 0
+        self.slowest      = (None, 0.0)
+        self._file_size   = 0
+
+    def add(self, phase, seconds, rel=None):
+        """Soma `seconds` à fase; vai para o arquivo atual ou, com `rel`, para ele."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        file = self._file if rel is None else self.per_file.setdefault(rel, {})
+        if file is not None:
+            file[phase] = file.get(phase, 0.0) + seconds
+
+    def merge(self, other):
+        """Soma as fases e contadores de `other` (medidos noutra thread) aos
+        totais e ao arquivo atual."""
+        for phase, sec in other.phases.items():
+            if sec:
+                self.add(phase, sec)
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    @contextmanager
+    def timer(self, phase):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - t0)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin_file(self, rel, size=0):
+        self._file    = self.per_file.setdefault(rel, {})
+        self._file_t0 = time.perf_counter()
+        self._file_size   = size
+        self.current_line = 0
+        self.current      = (rel, self._file_t0)
+
+    def end_file(self):
+        if self._file is not None:
+            self._file["total"] = (self._file.get("total", 0.0)
+                                   + time.perf_counter() - self._file_t0)
+            if self._file["total"] > self.slowest[1]:
+                self.slowest = (self.current[0], self._file["total"])
+        self.done_bytes  += self._file_size
+        self._file        = None
+        self.current      = None
+        self.current_line = 0
+
+    def now(self):
+        """Segundos desde o início (ou a duração final, se já encerrada)."""
+        return self.elapsed or (time.perf_counter() - self._t0)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._t0
+        return self
+
+    def slowest_files(self, n=5):
+        ranked = sorted(self.per_file.items(),
+                        key=lambda kv: kv[1].get("total", 0.0), reverse=True)
+        return [(rel, ph.get("total", 0.0)) for rel, ph in ranked[:n]]
+
+    def summary_lines(self):
+        """Linhas de resumo (sem prefixo) para o log e o cabeçalho do relatório."""
+        total = self.now()
+        lines = [f"DESEMPENHO — {self.name}: {total:.3f}s no total"]
+        for key, label in PHASES:
+            sec = self.phases.get(key, 0.0)
+            if not sec:
+                continue
+            pct = sec / total * 100 if total else 0.0
+            lines.append(f"  {label:<32s} {sec:9.3f}s  ({pct:5.1f}%)")
+        if self.counters:
+            cnt = " | ".join(f"{k}={v}" for k, v in self.counters.items())
+            lines.append(f"  Contadores: {cnt}")
+        slow = [f"{rel} ({sec:.3f}s)" for rel, sec in self.slowest_files() if sec]
+        if slow:
+            lines.append(f"  Arquivos mais lentos: {'; '.join(slow)}")
+        return lines
+
+
+class RunProfiler:
+    """Perfil opcional de UMA execução.
+
+    Liga o cProfile na thread de trabalho e, em paralelo, amostra a pilha
+    dessa thread para gerar um arquivo de pilhas colapsadas (formato
+    "f1;f2;f3 N"), legível por flamegraph.pl / speedscope / inferno.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._prof    = None
+        self._ident   = None
+        self._stacks  = Counter()
+        self._stop    = threading.Event()
+        self._thread  = None
+
+    def start(self):
+        """Deve ser chamado de dentro da thread de trabalho."""
+        import cProfile
+        self._ident = threading.get_ident()
+        self._prof  = cProfile.Profile()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._prof.enable()
+
+    def _sample(self):
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            frame = current_frames().get(self._ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}"
+                             f":{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, base_path):
+        """Encerra o perfil e grava <base>.prof e <base>.folded."""
+        if self._prof is None:
+            return None, None
+        self._prof.disable()
+        self._stop.set()
+        self._thread.join()
+        base_path  = Path(base_path)
+        prof_path  = base_path.with_name(base_path.name + ".prof")
+        fold_path  = base_path.with_name(base_path.name + ".folded")
+        self._prof.dump_stats(str(prof_path))
+        with open(fold_path, "w", encoding="utf-8") as f:
+            for stack, n in self._stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        self._prof = None
+        return prof_path, fold_path
+
+
+def fmt_bytes(n):
+    """Formata um tamanho em bytes (B, KB, MB, GB)."""
+    if n is None:
+        return "n/d"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def deep_sizeof(obj, seen=None):
+    """Estimativa do tamanho profundo de dicts/listas/tuplas/sets de strings.
+
+    Objetos já contados em `seen` (por id) não são somados de novo, o que
+    permite medir o custo ADICIONAL de contêineres que compartilham dados.
+    """
+    if seen is None:
+        seen = set()
+    size  = 0
+    stack = [obj]
+    getsizeof = sys.getsizeof
+    while stack:
+        o = stack.pop()
+        oid = id(o)
+        if oid in seen:
+            continue
+        seen.add(oid)
+        size += getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return size
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo (None se indisponível)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _PMC(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD),
+                            ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t),
+                            ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t),
+                            ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            pmc = _PMC()
+            pmc.cb = ctypes.sizeof(_PMC)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.WinDLL("psapi").GetProcessMemoryInfo(handle, ctypes.byref(pmc), pmc.cb):
+                return pmc.PeakWorkingSetSize
+        except Exception:
+            pass
+    return None
+
+
+class MemoryProfiler:
+    """Contabilidade de memória opcional para construção e aplicação.
+
+    Tira snapshots do tracemalloc nas fronteiras de fase (com os maiores
+    crescimentos por linha de código), estima o tamanho profundo de cada
+    contêiner de mapeamento e registra o pico de RSS do processo.
+    """
+
+    def __init__(self, name):
+        self.name       = name
+        self.phases     = []        # [(rótulo, atual, pico, rss, [top alocações])]
+        self.containers = []        # [(nome, profundo, adicional)]
+        self.lines_max  = (None, 0) # (arquivo, bytes) maior lista de linhas
+        self.lines_sum  = 0
+        self._owns      = False
+        self._last      = None
+
+    def start(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns = True
+        self.snapshot("início")
+
+    def snapshot(self, label):
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        snap = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+        top = []
+        if self._last is not None:
+            for diff in snap.compare_to(self._last, "lineno")[:3]:
+                if diff.size_diff > 0:
+                    frame = diff.traceback[0]
+                    top.append(f"{Path(frame.filename).name}:{frame.lineno} "
+                               f"+{fmt_bytes(diff.size_diff)}")
+        self._last = snap
+        self.phases.append((label, current, peak, peak_rss_bytes(), top))
+
+    def note_lines(self, rel, *line_lists):
+        size = sum(deep_sizeof(lines) for lines in line_lists)
+        self.lines_sum += size
+        if size > self.lines_max[1]:
+            self.lines_max = (rel, size)
+
+    def measure(self, containers):
+        """containers: [(nome, objeto)]; 'adicional' desconta o que já foi medido."""
+        shared = set()
+        for name, obj in containers:
+            self.containers.append((name, deep_sizeof(obj), deep_sizeof(obj, shared)))
+
+    def stop(self):
+        import tracemalloc
+        self.snapshot("fim")
+        if self._owns:
+            tracemalloc.stop()
+            self._owns = False
+        self._last = None
+        return self
+
+    def summary_lines(self):
+        lines = [f"MEMÓRIA — {self.name}"]
+        for label, current, peak, rss, top in self.phases:
+            lines.append(f"  [{label}] tracemalloc atual {fmt_bytes(current)} | "
+                         f"pico {fmt_bytes(peak)} | pico RSS {fmt_bytes(rss)}")
+            if top:
+                lines.append(f"      maiores crescimentos: {'; '.join(top)}")
+        for name, deep, extra in self.containers:
+            lines.append(f"  {name:<18s} {fmt_bytes(deep):>10s} profundo | "
+                         f"{fmt_bytes(extra):>10s} adicional")
+        if self.lines_max[0] is not None:
+            lines.append(f"  Listas de linhas (read_lines): maior {fmt_bytes(self.lines_max[1])} "
+                         f"({self.lines_max[0]}) | soma {fmt_bytes(self.lines_sum)}")
+        return lines
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CANCELAMENTO E CHECKPOINTS
+# ─────────────────────────────────────────────────────────────────────────────
+class CancelToken:
+    """Sinal de cancelamento cooperativo, verificado pelo worker entre
+    arquivos e dentro do laço de busca fuzzy."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def close_match(word, possibilities, cutoff, token=None):
+    """Equivalente a difflib.get_close_matches(word, possibilities, n=1, cutoff),
+    mas interrompível: devolve None assim que `token` for cancelado."""
+    if not 0.0 <= cutoff <= 1.0:
+        raise ValueError(f"cutoff must be in [0.0, 1.0]: {cutoff!r}")
+    if token is not None and token.cancelled:
+        return None
+    best = None
+    s = difflib.SequenceMatcher()
+    s.set_seq2(word)
+    for i, x in enumerate(possibilities):
+        if token is not None and not i & 255 and token.cancelled:
+            return None
+        s.set_seq1(x)
+        if (s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff):
+            score = s.ratio()
+            if score >= cutoff and (best is None or (score, x) > best):
+                best = (score, x)
+    return best[1] if best else None
+
+
+class ApplyCheckpoint:
+    """Checkpoint periódico de uma aplicação: arquivos concluídos e seus problemas.
+
+    Gravado ao lado do relatório (relatorio_*.checkpoint.json) a cada
+    `interval` segundos e ao cancelar; uma execução retomada com as mesmas
+    configurações pula esses arquivos e ainda gera o relatório completo.
+    """
+    VERSION = 1
+
+    def __init__(self, path, settings, done=None, interval=5.0):
+        self.path     = Path(path)
+        self.settings = settings
+        self.done     = dict(done or {})   # {rel: {"ok": bool, "issues": [...]}}
+        self.interval = interval
+        self._saved   = time.monotonic()
+
+    @classmethod
+    def load(cls, path, settings):
+        """Lê um checkpoint compatível com `settings` (ou None)."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != cls.VERSION or data.get("settings") != settings:
+            return None
+        return cls(path, settings, data.get("done"))
+
+    def mark(self, rel, ok, issues):
+        self.done[rel] = {"ok": ok, "issues": list(issues)}
+        if time.monotonic() - self._saved >= self.interval:
+            self.save()
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "settings": self.settings,
+                       "done": self.done}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._saved = time.monotonic()
+
+    def discard(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  NORMALIZAÇÃO DE CHAVES E REGRAS DE IGNORAR
+# ─────────────────────────────────────────────────────────────────────────────
+class TextNormalizer:
+    """Pipeline de normalização das chaves: Unicode → espaços → caixa.
+
+    Aplicado às chaves do dicionário uma vez (índice em ContentMap) e às
+    linhas de C na busca, para que diferenças de espaços finais, tab vs
+    espaço, NFC vs NFD ou maiúsculas virem acertos O(1) em vez de fuzzy.
+    """
+
+    def __init__(self, collapse_ws=False, unicode_form=None, casefold=False):
+        self.collapse_ws  = collapse_ws
+        self.unicode_form = unicode_form or None
+        self.casefold     = casefold
+        self.key          = (collapse_ws, self.unicode_form, casefold)
+
+    @property
+    def active(self):
+        return self.collapse_ws or self.unicode_form is not None or self.casefold
+
+    def __call__(self, s):
+        if self.unicode_form is not None:
+            s = unicodedata.normalize(self.unicode_form, s)
+        if self.collapse_ws:
+            s = " ".join(s.split())
+        if self.casefold:
+            s = s.casefold()
+        return s
+
+    def describe(self):
+        parts = []
+        if self.collapse_ws:              parts.append("espaços")
+        if self.unicode_form is not None: parts.append(self.unicode_form)
+        if self.casefold:                 parts.append("caixa")
+        return "+".join(parts) or "Nenhuma"
+
+
+class IgnoreRules:
+    """Regras de linhas ignoradas, compiladas uma vez por execução.
+
+    Prefixos são testados com um único str.startswith(tupla) na linha sem
+    espaços à esquerda; as regex são unidas numa só alternância e
+    procuradas (re.search) na linha.
+    """
+
+    def __init__(self, prefixes=(), patterns=()):
+        self.prefixes = tuple(p for p in prefixes if p)
+        self.patterns = [p for p in patterns if p]
+        self._regex   = (re.compile("|".join(f"(?:{p})" for p in self.patterns))
+                         if self.patterns else None)
+
+    def __bool__(self):
+        return bool(self.prefixes) or self._regex is not None
+
+    def __call__(self, line):
+        if self.prefixes and line.lstrip().startswith(self.prefixes):
+            return True
+        return self._regex is not None and self._regex.search(line) is not None
+
+    def for_bytes(self, encoding, universal_newlines=False):
+        """Mesma regra para linhas em bytes (com a quebra) numa codificação compatível com ASCII.
+
+        Prefixos são testados direto nos bytes; regex, ou linhas cujo início
+        (após espaços ASCII) não é ASCII, são decodificadas e testadas em texto.
+        """
+        prefixes = []
+        for p in self.prefixes:
+            try: prefixes.append(p.encode(encoding))
+            except UnicodeError: continue
+        prefixes = tuple(prefixes)
+
+        def as_text(line):
+            text = line.decode(encoding)
+            if universal_newlines:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            return self(text)
+
+        def check(line):
+            if self._regex is not None:
+                return as_text(line)
+            stripped = line.lstrip()
+            if stripped and (stripped[0] >= 0x80 or 0x1c <= stripped[0] <= 0x1f):
+                return as_text(line)          # str.lstrip removeria mais espaços
+            return bool(prefixes) and stripped.startswith(prefixes)
+        return check
+
+
+class ContentIndexes:
+    """Índices derivados das chaves (normalizado, modelos, frases, bytes).
+
+    Base de ContentMap e PackedMap: só usa items()/iteração/len() do
+    dicionário, e cada índice é refeito se as opções mudarem ou se novas
+    chaves forem adicionadas (caso do dicionário único).
+    """
+    __slots__ = ()
+
+    def _reset_indexes(self):
+        self._norm_key   = None
+        self._norm_index = None
+        self._norm_len   = -1
+        self._tmpl_key   = None
+        self._tmpl_index = None
+        self._phrase_len     = -1
+        self._phrase_matcher = None
+        self._bytes_key      = None
+        self._bytes_map      = None
+        self._fp_len         = -1
+        self._fp             = None
+
+    def fingerprint(self):
+        """Hash dos pares (hex), refeito se o dicionário crescer; identifica o
+        dicionário no cache de decisões entre execuções."""
+        if self._fp is None or self._fp_len != len(self):
+            self._fp     = pairs_fingerprint(self.items())
+            self._fp_len = len(self)
+        return self._fp
+
+    def normalized_for(self, normalizer):
+        if (self._norm_index is None or self._norm_key != normalizer.key
+                or self._norm_len != len(self)):
+            index = {}
+            for orig in self:
+                index.setdefault(normalizer(orig), orig)
+            self._norm_index = index
+            self._norm_key   = normalizer.key
+            self._norm_len   = len(self)
+        return self._norm_index
+
+    def templates_for(self, normalizer):
+        """Índice de modelos (TemplateIndex), refeito nas mesmas condições do normalizado."""
+        key = (normalizer.key, len(self))
+        if self._tmpl_index is None or self._tmpl_key != key:
+            self._tmpl_index = TemplateIndex(self.items(), normalizer)
+            self._tmpl_key   = key
+        return self._tmpl_index
+
+    def phrases(self):
+        """Autômato de frases (PhraseMatcher) das chaves, refeito se o dicionário crescer."""
+        if self._phrase_matcher is None or self._phrase_len != len(self):
+            self._phrase_matcher = PhraseMatcher(
+                (orig, trans.rstrip("\r\n")) for orig, trans in self.items())
+            self._phrase_len = len(self)
+        return self._phrase_matcher
+
+    def encoded(self, encoding, newline=os.linesep):
+        """Cópia bytes → bytes já na codificação/quebra de linha da saída.
+
+        Pares que não cabem na codificação ficam de fora: a linha cai na
+        busca em texto, que reproduz o comportamento do caminho normal.
+        """
+        key = (codecs.lookup(encoding).name, newline, len(self))
+        if self._bytes_map is None or self._bytes_key != key:
+            bmap = {}
+            for orig, trans in self.items():
+                try:
+                    bmap[orig.encode(encoding)] = trans.replace("\n", newline).encode(encoding)
+                except UnicodeError:
+                    continue
+            self._bytes_map = bmap
+            self._bytes_key = key
+        return self._bytes_map
+
+
+INDEX_SLOTS = ("_norm_key", "_norm_index", "_norm_len", "_tmpl_key", "_tmpl_index",
+               "_phrase_len", "_phrase_matcher", "_bytes_key", "_bytes_map",
+               "_fp_len", "_fp")
+
+
+def pairs_fingerprint(items):
+    """blake2b (hex) dos pares orig → tradução, na ordem."""
+    h = hashlib.blake2b(digest_size=16)
+    for orig, trans in items:
+        h.update(orig.encode("utf-8", "surrogatepass") + b"\x00")
+        h.update(trans.encode("utf-8", "surrogatepass") + b"\x01")
+    return h.hexdigest()
+
+
+class ContentMap(ContentIndexes, dict):
+    """Dicionário orig → tradução (modo conteúdo) com índice de chaves normalizadas.
+
+    O índice normalizado→orig é montado na primeira busca com um dado
+    normalizador e reaproveitado; é refeito se as opções mudarem ou se
+    novas chaves forem adicionadas (caso do dicionário único).
+    """
+    __slots__ = INDEX_SLOTS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reset_indexes()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  DICIONÁRIO COMPARTILHADO (arquivo mapeado em memória, só leitura)
+# ─────────────────────────────────────────────────────────────────────────────
+#  Layout (little-endian):
+#      cabeçalho   PACKED_MAGIC, nº de pares, nº de posições (potência de 2),
+#                  início da arena, impressão digital (16 bytes)
+#      índice      posições de (hash de 8 bytes, deslocamento do par + 1);
+#                  0 marca posição vazia; endereçamento aberto com sondagem linear
+#      arena       pares na ordem original: tam. chave, tam. tradução (uint32),
+#                  chave e tradução em UTF-8
+#
+#  Outros processos abrem o arquivo com PackedMap em O(1): o sistema
+#  compartilha as páginas entre todos, e só as chaves consultadas são lidas.
+PACKED_MAGIC  = b"TMPACK01"
+PACKED_HEADER = "<8sQQQ16s"
+PACKED_SLOT   = "<QQ"
+PACKED_PAIR   = "<II"
+
+
+def _packed_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def pack_mapping(mapping, path):
+    """Grava `mapping` (orig → tradução) no formato de PackedMap.
+
+    O arquivo é escrito ao lado e trocado no fim (os.replace), então quem já
+    está com a versão anterior aberta continua lendo um arquivo inteiro.
+    """
+    items   = [(k.encode("utf-8", "surrogatepass"), v.encode("utf-8", "surrogatepass"))
+               for k, v in mapping.items()]
+    n_slots = 8
+    while n_slots < 2 * len(items):
+        n_slots *= 2
+    header  = struct.calcsize(PACKED_HEADER)
+    arena   = header + n_slots * struct.calcsize(PACKED_SLOT)
+    slots   = [(0, 0)] * n_slots
+    mask    = n_slots - 1
+    pairs   = bytearray()
+    for key, value in items:
+        h = _packed_hash(key)
+        i = h & mask
+        while slots[i][1]:
+            i = (i + 1) & mask
+        slots[i] = (h, len(pairs) + 1)
+        pairs += struct.pack(PACKED_PAIR, len(key), len(value)) + key + value
+    fp  = bytes.fromhex(pairs_fingerprint(mapping.items()))
+    path = Path(path)
+    tmp  = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(struct.pack(PACKED_HEADER, PACKED_MAGIC, len(items), n_slots, arena, fp))
+        f.write(b"".join(struct.pack(PACKED_SLOT, h, off) for h, off in slots))
+        f.write(pairs)
+    os.replace(tmp, path)
+    return path
+
+
+class PackedMap(ContentIndexes):
+    """Dicionário só leitura sobre um arquivo de pack_mapping, mapeado em memória.
+
+    Abrir só lê o cabeçalho; cada busca calcula o hash, sonda o índice e
+    decodifica a chave/tradução direto das páginas mapeadas, sem carregar o
+    dicionário. Serve onde um ContentMap serve: os índices derivados
+    (normalizado, modelos, frases) são montados no processo se forem pedidos.
+    """
+    __slots__ = INDEX_SLOTS + ("path", "_file", "_buf", "_len", "_mask", "_index",
+                               "_arena", "_fingerprint")
+
+    def __init__(self, path):
+        self.path  = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, n, n_slots, arena, fp = struct.unpack_from(PACKED_HEADER, self._buf)
+        except (ValueError, OSError, struct.error) as e:
+            self._file.close()
+            raise ValueError(f"{self.path.name}: não é um dicionário compactado ({e})")
+        if magic != PACKED_MAGIC:
+            self.close()
+            raise ValueError(f"{self.path.name}: não é um dicionário compactado")
+        self._len   = n
+        self._mask  = n_slots - 1
+        self._index = struct.calcsize(PACKED_HEADER)
+        self._arena = arena
+        self._fingerprint = fp.hex()
+        self._reset_indexes()
+
+    def close(self):
+        self._buf.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._len
+
+    def _pair(self, off):
+        """(chave, tradução) em bytes do par no deslocamento `off` da arena."""
+        pos = self._arena + off
+        klen, vlen = struct.unpack_from(PACKED_PAIR, self._buf, pos)
+        pos += 8
+        return self._buf[pos:pos + klen], self._buf[pos + klen:pos + klen + vlen]
+
+    def _find(self, key):
+        try:
+            kb = key.encode("utf-8", "surrogatepass")
+        except AttributeError:
+            return None
+        h    = _packed_hash(kb)
+        i    = h & self._mask
+        buf  = self._buf
+        while True:
+            sh, off = struct.unpack_from(PACKED_SLOT, buf, self._index + 16 * i)
+            if not off:
+                return None
+            if sh == h:
+                k, v = self._pair(off - 1)
+                if k == kb:
+                    return v.decode("utf-8", "surrogatepass")
+            i = (i + 1) & self._mask
+
+    def get(self, key, default=None):
+        value = self._find(key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self._find(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def items(self):
+        """Pares (orig, tradução) na ordem em que foram gravados."""
+        pos, end, buf = self._arena, len(self._buf), self._buf
+        while pos < end:
+            klen, vlen = struct.unpack_from(PACKED_PAIR, buf, pos)
+            pos += 8
+            yield (buf[pos:pos + klen].decode("utf-8", "surrogatepass"),
+                   buf[pos + klen:pos + klen + vlen].decode("utf-8", "surrogatepass"))
+            pos += klen + vlen
+
+    def keys(self):
+        return (k for k, _ in self.items())
+
+    def values(self):
+        return (v for _, v in self.items())
+
+    __iter__ = keys
+
+    def fingerprint(self):
+        return self._fingerprint     # gravada por pack_mapping: O(1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CORRESPONDÊNCIA POR MODELO (PLACEHOLDERS)
+# ─────────────────────────────────────────────────────────────────────────────
+# Variáveis reconhecidas, na ordem de prioridade: {0}/{nome}, printf (%d, %.2f,
+# %s), tags <color=#fff>/</b>, escapes literais \n \t \r e números soltos.
+PLACEHOLDER_RE = re.compile(
+    r"(?P<B>\{[^{}\n]*\})"
+    r"|(?P<P>%[-+ #0]*\d*(?:\.\d+)?[sdifuxXeEgGc%])"
+    r"|(?P<T></?[A-Za-z][^<>\n]*>)"
+    r"|(?P<E>\\[nrt])"
+    r"|(?P<N>(?<![A-Za-z_])\d+(?:\.\d+)?(?![A-Za-z_]))"
+)
+SLOT = "\x01"
+
+
+def template_skeleton(s):
+    """Devolve (esqueleto, valores): cada variável vira SLOT + tipo no esqueleto."""
+    values = []
+    parts  = []
+    pos    = 0
+    for m in PLACEHOLDER_RE.finditer(s):
+        parts.append(s[pos:m.start()])
+        parts.append(SLOT + m.lastgroup)
+        values.append(m.group())
+        pos = m.end()
+    if not values:
+        return s, values
+    parts.append(s[pos:])
+    return "".join(parts), values
+
+
+class TemplateIndex:
+    """Índice esqueleto → tradução-modelo para linhas com variáveis.
+
+    Cada chave de A com variáveis é mascarada num esqueleto; a tradução de B
+    vira uma lista de trechos literais e posições de variável (a k-ésima
+    ocorrência de um valor em B aponta para a k-ésima em A). Na busca, a
+    linha de C é mascarada do mesmo jeito e os seus próprios valores são
+    devolvidos aos lugares correspondentes da tradução. Pares em que B não
+    repete todas as variáveis de A ("Take 2 potions" → "Tome duas poções")
+    não viram modelo: a tradução fixa sairia com o valor errado.
+    """
+
+    def __init__(self, items, normalizer=None):
+        self.normalizer = normalizer if normalizer is not None and normalizer.active else None
+        self.index = {}
+        for orig, trans in items:
+            skel, values = template_skeleton(orig)
+            # Só variáveis (ex.: "100") casaria com qualquer número: fica de fora
+            if not values or not any(ch.isalpha() for ch in PLACEHOLDER_RE.sub("", orig)):
+                continue
+            if self.normalizer is not None:
+                skel = self.normalizer(skel)
+            if skel not in self.index:
+                parts = self._compile(values, trans)
+                if parts is not None:
+                    self.index[skel] = parts
+
+    def __len__(self):
+        return len(self.index)
+
+    @staticmethod
+    def _compile(values, trans):
+        """Trechos de `trans` com as posições das variáveis; None se faltar alguma."""
+        positions = {}
+        for i, v in enumerate(values):
+            positions.setdefault(v, []).append(i)
+        seen  = Counter()
+        parts = []
+        pos   = 0
+        for m in PLACEHOLDER_RE.finditer(trans):
+            v = m.group()
+            slots = positions.get(v)
+            if not slots:
+                continue
+            k = seen[v]
+            seen[v] += 1
+            parts.append(trans[pos:m.start()])
+            parts.append(slots[k] if k < len(slots) else slots[0])
+            pos = m.end()
+        parts.append(trans[pos:])
+        if len({p for p in parts if isinstance(p, int)}) < len(values):
+            return None
+        return parts
+
+    def lookup(self, s):
+        """Tradução de `s` com os valores da própria linha, ou None."""
+        skel, values = template_skeleton(s)
+        if not values:
+            return None
+        if self.normalizer is not None:
+            skel = self.normalizer(skel)
+        parts = self.index.get(skel)
+        if parts is None:
+            return None
+        return "".join(values[p] if isinstance(p, int) else p for p in parts)
+
+
+class ContentLookup:
+    """Cadeia de busca do modo conteúdo: exata → normalizada → modelo → fuzzy.
+
+    `find(s)` devolve (tradução, chave fuzzy ou None, tipo), com tipo em
+    "exata", "normalizada", "modelo", "fuzzy" ou "falha". A lista de chaves
+    para o fuzzy só é montada na primeira linha que chegar até ele.
+
+    Com `decisions` (ver DecisionCache) o resultado do fuzzy e a
+    similaridade vêm de execuções anteriores quando a linha já foi vista.
+    """
+
+    def __init__(self, mapping, normalizer, templates, threshold, stats=None,
+                 decisions=None):
+        self.mapping    = mapping
+        self.normalizer = normalizer
+        self.norm_index = mapping.normalized_for(normalizer) if normalizer.active else None
+        self.tmpl_index = mapping.templates_for(normalizer) if templates else None
+        self.threshold  = threshold
+        self.stats      = stats
+        self.decisions  = decisions
+        self.t_fuzzy    = 0.0
+        self._keys      = None
+
+    def find(self, s, token=None):
+        mapping = self.mapping
+        val = mapping.get(s)
+        if val is not None:
+            return val, None, "exata"
+        if self.norm_index is not None:
+            orig = self.norm_index.get(self.normalizer(s))
+            if orig is not None:
+                if self.stats is not None:
+                    self.stats.count("normalizadas")
+                return mapping[orig], None, "normalizada"
+        if self.tmpl_index:
+            hit = self.tmpl_index.lookup(s)
+            if hit is not None:
+                return hit, None, "modelo"
+        if self.threshold < 1.0:
+            decisions = self.decisions
+            if decisions is not None:
+                hit = decisions.get(s)
+                if hit is not None:
+                    if self.stats is not None:
+                        self.stats.count("decisoes_cache")
+                    return hit[:3]
+            t0 = time.perf_counter()
+            if self._keys is None:
+                self._keys = list(mapping.keys())
+            best = close_match(s, self._keys, self.threshold, token)
+            if best is not None:
+                hit = (mapping[best], best, "fuzzy",
+                       difflib.SequenceMatcher(None, s, best).ratio())
+            else:
+                hit = (None, None, "falha", 0.0)
+            self.t_fuzzy += time.perf_counter() - t0
+            if decisions is not None and not (token is not None and token.cancelled):
+                decisions.put(s, hit)
+            return hit[:3]
+        return None, None, "falha"
+
+    def similarity(self, s, best):
+        """Similaridade entre `s` e a chave fuzzy escolhida (do cache, se houver)."""
+        if self.decisions is not None:
+            hit = self.decisions.get(s)
+            if hit is not None and hit[1] == best:
+                return hit[3]
+        return difflib.SequenceMatcher(None, s, best).ratio()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CACHE DE DECISÕES (sqlite, entre execuções)
+# ─────────────────────────────────────────────────────────────────────────────
+DECISION_CACHE_FILE = "decisoes_cache.sqlite"
+DECISION_CACHE_ROWS = 200_000     # acima disso, as menos usadas saem (fica 90%)
+
+
+class FileDecisions:
+    """Decisões de um dicionário: as carregadas do disco e as novas da execução.
+
+    As linhas são guardadas pela forma normalizada (a mesma que a busca
+    normalizada compara), então variações de caixa/espaços dividem a decisão.
+    """
+    __slots__ = ("known", "new", "used", "normalizer")
+
+    def __init__(self, known, normalizer=None):
+        self.known = known
+        self.new   = {}
+        self.used  = set()
+        self.normalizer = normalizer if normalizer is not None and normalizer.active else None
+
+    def get(self, s):
+        if self.normalizer is not None:
+            s = self.normalizer(s)
+        hit = self.known.get(s)
+        if hit is not None and s not in self.new:
+            self.used.add(s)
+        return hit
+
+    def put(self, s, hit):
+        if self.normalizer is not None:
+            s = self.normalizer(s)
+        self.known[s] = hit
+        self.new[s]   = hit
+
+
+class DecisionCache:
+    """Decisões do fuzzy (tradução, chave escolhida, status, similaridade) em disco.
+
+    Chave: (impressão digital do dicionário, normalização, linha normalizada,
+    modo, limiar). A busca exata/normalizada/modelo vem antes e não passa
+    por aqui; só o fuzzy, que é a parte cara, é lembrado. Um dicionário
+    alterado tem outra impressão digital e outras opções de normalização
+    são outra chave, então as decisões antigas deixam de valer sozinhas e
+    acabam removidas pelo limite de linhas (as menos usadas saem).
+    """
+    SCHEMA = 2      # PRAGMA user_version; uma versão antiga é descartada
+
+    def __init__(self, path, max_rows=DECISION_CACHE_ROWS):
+        self.path     = Path(path)
+        self.max_rows = max_rows
+        self._lock    = threading.Lock()
+        self._loaded  = {}      # (dicionário, normalização, modo, limiar) → FileDecisions
+        import sqlite3
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != self.SCHEMA:
+            self._db.executescript(f"""
+                DROP TABLE IF EXISTS decisoes;
+                PRAGMA user_version = {self.SCHEMA};
+            """)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS decisoes (
+                dicionario TEXT, normalizacao TEXT, linha TEXT, modo TEXT, limiar REAL,
+                traducao TEXT, chave TEXT, status TEXT, similaridade REAL, uso REAL,
+                PRIMARY KEY (dicionario, normalizacao, linha, modo, limiar)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS decisoes_uso ON decisoes (uso);
+        """)
+
+    def decisions_for(self, mapping, mode, threshold, normalizer=None):
+        """FileDecisions do dicionário (lidas do disco na primeira vez na execução)."""
+        active = normalizer is not None and normalizer.active
+        norm   = json.dumps(normalizer.key) if active else ""
+        key    = (mapping.fingerprint(), norm, mode, round(threshold, 4))
+        with self._lock:
+            dec = self._loaded.get(key)
+            if dec is None:
+                rows = self._db.execute(
+                    "SELECT linha, traducao, chave, status, similaridade FROM decisoes "
+                    "WHERE dicionario = ? AND normalizacao = ? AND modo = ? AND limiar = ?",
+                    key)
+                dec = FileDecisions({r[0]: r[1:] for r in rows}, normalizer)
+                self._loaded[key] = dec
+        return dec
+
+    def flush(self):
+        """Grava as decisões novas e marca as reaproveitadas como usadas agora."""
+        now = time.time()
+        with self._lock, self._db:
+            for (fp, norm, mode, threshold), dec in self._loaded.items():
+                if dec.new:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO decisoes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(fp, norm, s, mode, threshold, *hit, now)
+                         for s, hit in dec.new.items()])
+                    dec.new = {}
+                if dec.used:
+                    self._db.executemany(
+                        "UPDATE decisoes SET uso = ? WHERE dicionario = ? AND normalizacao = ? "
+                        "AND linha = ? AND modo = ? AND limiar = ?",
+                        [(now, fp, norm, s, mode, threshold) for s in dec.used])
+                    dec.used = set()
+
+    def close(self):
+        self.flush()
+        with self._lock, self._db:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM decisoes").fetchone()
+            if n > self.max_rows:
+                keep = int(self.max_rows * 0.9)
+                self._db.execute(
+                    "DELETE FROM decisoes WHERE uso < (SELECT uso FROM decisoes "
+                    "ORDER BY uso DESC LIMIT 1 OFFSET ?)", (keep - 1,))
+        self._db.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  SUBSTITUIÇÃO DE FRASES (autômato Aho–Corasick)
+# ─────────────────────────────────────────────────────────────────────────────
+MAPPING_MODES = {"content": "Conteúdo", "positional": "Posicional", "phrases": "Frases"}
+
+
+class PhraseMatcher:
+    """Substitui todas as frases do dicionário numa linha em uma única passada.
+
+    As chaves viram uma trie com ligações de falha (Aho–Corasick); `hit[n]`
+    guarda o nó terminal mais longo que é sufixo do nó n, de modo que cada
+    posição do texto custa O(1) amortizado, independente do número de frases.
+    As ocorrências escolhidas são as mais à esquerda e, empatadas, as mais
+    longas, sem sobreposição.
+    """
+
+    def __init__(self, pairs):
+        goto   = [{}]
+        depth  = [0]
+        term   = [-1]
+        values = []
+        for phrase, repl in pairs:
+            if not phrase:
+                continue
+            node = 0
+            for ch in phrase:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    depth.append(depth[node] + 1)
+                    term.append(-1)
+                node = nxt
+            if term[node] < 0:
+                term[node] = len(values)
+                values.append(repl)
+
+        fail = [0] * len(goto)
+        hit  = [-1] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            if term[node] >= 0:
+                hit[node] = node
+        for node in queue:                    # BFS: a lista cresce durante o laço
+            for ch, nxt in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f
+                hit[nxt]  = nxt if term[nxt] >= 0 else hit[f]
+                queue.append(nxt)
+
+        self.goto, self.fail, self.depth = goto, fail, depth
+        self.term, self.hit, self.values = term, hit, values
+
+    def __len__(self):
+        return len(self.values)
+
+    def replace(self, s):
+        """Devolve (linha substituída, nº de substituições)."""
+        goto, fail, depth = self.goto, self.fail, self.depth
+        hit, term, values = self.hit, self.term, self.values
+        out   = []
+        count = 0
+        pos   = 0          # texto já emitido até aqui
+        best  = None       # (início, fim, valor) da melhor ocorrência pendente
+        state = 0
+        i, n  = 0, len(s)
+        while True:
+            if i < n:
+                ch = s[i]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+                i += 1
+                h = hit[state]
+                if h >= 0 and (best is None or i - depth[h] <= best[0]):
+                    best = (i - depth[h], i, term[h])
+                # Nenhuma ocorrência futura pode começar antes de i - depth[state]
+                if best is None or best[0] >= i - depth[state]:
+                    continue
+            elif best is None:
+                break
+            out.append(s[pos:best[0]])
+            out.append(values[best[2]])
+            count += 1
+            pos = i = best[1]
+            best, state = None, 0
+        if not count:
+            return s, 0
+        out.append(s[pos:])
+        return "".join(out), count
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  EXTRATORES DE FORMATO (só os trechos traduzíveis de cada linha)
+# ─────────────────────────────────────────────────────────────────────────────
+# Cada extrator recebe uma linha (sem quebra) e devolve [(início, fim), ...]
+# com os trechos traduzíveis; o resto da linha (código, IDs, aspas) é mantido
+# intacto e a tradução é encaixada de volta nas mesmas posições.
+_JSON_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_JSON_KEY_RE    = re.compile(r'\s*:')
+_LUA_TOKEN_RE   = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|(--)')
+_LUA_KEY_RE     = re.compile(r'\s*\]\s*=')
+
+
+def _has_text(s):
+    return any(ch.isalpha() for ch in s)
+
+
+def kv_spans(line):
+    """`chave = valor`: o valor (sem aspas externas); comentários # ; ! ignorados."""
+    if line.lstrip().startswith(("#", ";", "!")):
+        return []
+    eq = line.find("=")
+    if eq < 0:
+        return []
+    start, end = eq + 1, len(line.rstrip())
+    while start < end and line[start] in " \t":
+        start += 1
+    if end - start >= 2 and line[start] == line[end - 1] and line[start] in "\"'":
+        start, end = start + 1, end - 1
+    return [(start, end)] if _has_text(line[start:end]) else []
+
+
+def csv_spans(line, sep=","):
+    """Campos de uma linha CSV a partir da 2ª coluna (a 1ª é o ID)."""
+    spans = []
+    i, n, col = 0, len(line), 0
+    while i <= n:
+        if i < n and line[i] == '"':
+            j = i + 1
+            while j < n:
+                if line[j] == '"':
+                    if j + 1 < n and line[j + 1] == '"':
+                        j += 2
+                        continue
+                    break
+                j += 1
+            start, end = i + 1, j
+            k = line.find(sep, j)
+            nxt = n + 1 if k < 0 else k + 1
+        else:
+            k = line.find(sep, i)
+            start, end = i, (n if k < 0 else k)
+            nxt = end + 1
+        if col > 0 and _has_text(line[start:end]):
+            spans.append((start, end))
+        col += 1
+        i = nxt
+    return spans
+
+
+def json_spans(line):
+    """Strings JSON que são valores (as seguidas de ':' são chaves)."""
+    return [m.span(1) for m in _JSON_STRING_RE.finditer(line)
+            if not _JSON_KEY_RE.match(line, m.end()) and _has_text(m.group(1))]
+
+
+def lua_spans(line):
+    """Literais Lua "..." e '...', exceto índices ["chave"] = e comentários --."""
+    spans = []
+    for m in _LUA_TOKEN_RE.finditer(line):
+        if m.group(3):
+            break
+        g = 1 if m.group(1) is not None else 2
+        if _LUA_KEY_RE.match(line, m.end()) or not _has_text(m.group(g)):
+            continue
+        spans.append(m.span(g))
+    return spans
+
+
+FORMAT_EXTRACTORS = {
+    "kv":   kv_spans,
+    "csv":  csv_spans,
+    "tsv":  lambda line: csv_spans(line, "\t"),
+    "json": json_spans,
+    "lua":  lua_spans,
+}
+EXTENSION_FORMATS = {
+    ".ini": "kv", ".cfg": "kv", ".properties": "kv", ".lang": "kv",
+    ".csv": "csv", ".tsv": "tsv", ".json": "json", ".lua": "lua",
+}
+FORMAT_LABELS = {"Linhas": None, "Automático": "auto", "key=value": "kv",
+                 "CSV": "csv", "JSON": "json", "Lua": "lua"}
+
+
+def extractor_for(fmt, path):
+    """Extrator do formato escolhido; "auto" decide pela extensão do arquivo."""
+    if fmt == "auto":
+        fmt = EXTENSION_FORMATS.get(Path(path).suffix.lower())
+    return FORMAT_EXTRACTORS.get(fmt) if fmt else None
+
+
+def extract_pairs(extractor, orig, trans):
+    """Pares (trecho A, trecho B) de uma linha; None se A e B divergem no formato."""
+    spans_a = extractor(orig)
+    spans_b = extractor(trans)
+    if len(spans_a) != len(spans_b):
+        return None
+    return [(orig[a:b], trans[c:d]) for (a, b), (c, d) in zip(spans_a, spans_b)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CAMINHO BINÁRIO (bytes → bytes, sem decodificar/recodificar linha a linha)
+# ─────────────────────────────────────────────────────────────────────────────
+# Separadores que str.splitlines reconhece e bytes.splitlines não: se o texto
+# tiver algum, as linhas em bytes não correspondem às de texto.
+_EXTRA_LINE_BREAKS = re.compile("[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+def bytes_compatible(enc, out_encoding, text):
+    """True se C (decodificado como `enc` em `text`) pode ser tratado em bytes.
+
+    Exige a mesma codificação da saída, compatível com ASCII nas quebras de
+    linha (sem BOM, UTF-16/32) e nenhuma quebra "exótica" no texto, para que
+    o resultado seja idêntico, byte a byte, ao do caminho em texto.
+    """
+    if enc is None:
+        return False
+    try:
+        if codecs.lookup(enc).name != codecs.lookup(out_encoding).name:
+            return False
+        if "\r\n #".encode(enc) != b"\r\n #":
+            return False
+    except (LookupError, UnicodeError):
+        return False
+    return _EXTRA_LINE_BREAKS.search(text) is None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  VARREDURA DE PASTAS E PACOTES (.zip / .tar / .tar.gz / .gz)
+# ─────────────────────────────────────────────────────────────────────────────
+ARCHIVE_SUFFIXES = (".tar.gz", ".tgz", ".tar", ".zip", ".gz")
+
+
+def is_archive(path):
+    path = Path(path)
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES) and path.is_file()
+
+
+def source_stem(path):
+    """Nome da pasta/pacote sem a extensão de pacote ("mods.zip" → "mods")."""
+    name = Path(path).name
+    if is_archive(path):
+        for suffix in ARCHIVE_SUFFIXES:
+            if name.lower().endswith(suffix):
+                return name[:-len(suffix)]
+    return name
+
+
+class ArchiveReader:
+    """Lê membros de um pacote sob demanda, com um único handle aberto.
+
+    O handle é reaproveitado entre leituras (uma de cada vez); num pacote
+    comprimido, ler um membro anterior ao último lido descomprime de novo
+    desde o início.
+    """
+    __slots__ = ("path", "kind", "_handle", "_lock")
+
+    def __init__(self, path, kind):
+        self.path    = Path(path)
+        self.kind    = kind         # "zip", "tar" ou "gz"
+        self._handle = None
+        self._lock   = threading.Lock()
+
+    def read(self, key):
+        """Bytes do membro `key` (nome no .zip, TarInfo no .tar, None no .gz)."""
+        import gzip
+        import tarfile
+        import zipfile
+        with self._lock:
+            try:
+                if self._handle is None:
+                    if self.kind == "zip":
+                        self._handle = zipfile.ZipFile(self.path)
+                    elif self.kind == "tar":
+                        self._handle = tarfile.open(self.path, "r:*")
+                    else:
+                        self._handle = gzip.open(self.path)
+                if self.kind == "zip":
+                    return self._handle.read(key)
+                if self.kind == "tar":
+                    return self._handle.extractfile(key).read()
+                self._handle.seek(0)
+                return self._handle.read()
+            except (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error) as e:
+                self.close()
+                raise OSError(f"{self.path}: {e}") from e
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class ScanEntry:
+    """Arquivo encontrado na varredura: caminho relativo (posix), tamanho e mtime.
+
+    Arquivos de pasta e membros de pacote (`source` = (ArchiveReader, chave))
+    só são lidos em read_bytes(). `read_bytes()` e `name` imitam Path.
+    """
+    __slots__ = ("rel", "path", "size", "mtime", "_source")
+
+    def __init__(self, rel, path, size, mtime=0.0, source=None):
+        self.rel     = rel
+        self.path    = path
+        self.size    = size
+        self.mtime   = mtime
+        self._source = source
+
+    @property
+    def name(self):
+        return self.rel.rsplit("/", 1)[-1]
+
+    def read_bytes(self):
+        if self._source is not None:
+            reader, key = self._source
+            return reader.read(key)
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def __str__(self):
+        return self.path
+
+
+def parse_extensions(text):
+    """".txt lua, .json" → (".txt", ".lua", ".json") em minúsculas."""
+    exts = []
+    for ext in text.replace(",", " ").replace(";", " ").split():
+        ext = ext.lower()
+        exts.append(ext if ext.startswith(".") else "." + ext)
+    return tuple(dict.fromkeys(exts)) or (".txt",)
+
+
+class ScanFilter:
+    """Decide quais caminhos relativos entram: extensões, recursão e globs.
+
+    Os globs (fnmatch, sem diferenciar maiúsculas) são testados contra o
+    caminho relativo posix; "*" também casa "/". Um glob de exclusão que
+    casa com uma subpasta a poda inteira da varredura.
+    """
+
+    def __init__(self, extensions, recursive=True, include=(), exclude=()):
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.recursive  = recursive
+        self.include    = tuple(g.lower() for g in include if g)
+        self.exclude    = tuple(g.lower() for g in exclude if g)
+
+    def __call__(self, rel):
+        low = rel.lower()
+        if not low.endswith(self.extensions):
+            return False
+        if not self.recursive and "/" in low:
+            return False
+        if self.include and not any(fnmatch.fnmatchcase(low, g) for g in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(low, g) for g in self.exclude)
+
+    def enter(self, rel_dir):
+        low = rel_dir.lower()
+        return not any(fnmatch.fnmatchcase(low, g) for g in self.exclude)
+
+    def describe(self):
+        parts = [" ".join(self.extensions)]
+        if self.include: parts.append("incluir " + " ".join(self.include))
+        if self.exclude: parts.append("excluir " + " ".join(self.exclude))
+        return " | ".join(parts)
+
+
+def member_rel(name):
+    """Caminho relativo posix de um membro de pacote; None se ele sair da raiz.
+
+    Recusa caminhos absolutos, com letra de unidade ou com ".." depois de
+    normalizado ("./a//b" → "a/b").
+    """
+    name = name.replace("\\", "/")
+    if name.startswith("/") or re.match(r"[A-Za-z]:", name):
+        return None
+    parts = PurePosixPath(name).parts
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def scan_archive(path, flt, log=None):
+    """Lista, numa única passada sequencial, os membros do pacote aceitos pelo filtro.
+
+    Só o índice é lido aqui; os bytes de cada membro vêm de read_bytes().
+    Membros cujo caminho sairia da pasta de destino são pulados.
+    """
+    import tarfile
+    import zipfile
+    log     = log or _no_log
+    path    = Path(path)
+    lower   = path.name.lower()
+    entries = []
+
+    def accept(name):
+        rel = member_rel(name)
+        if rel is None:
+            log(f"Membro ignorado em {path.name}: {name} (caminho fora da pasta)", "WARN")
+        return rel
+
+    if lower.endswith(".zip"):
+        reader = ArchiveReader(path, "zip")
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                rel = accept(info.filename)
+                if rel is None or not flt(rel):
+                    continue
+                entries.append(ScanEntry(rel, f"{path}/{rel}", info.file_size,
+                                         time.mktime(info.date_time + (0, 0, -1)),
+                                         (reader, info.filename)))
+    elif lower.endswith((".tar", ".tar.gz", ".tgz")):
+        reader = ArchiveReader(path, "tar")
+        with tarfile.open(path, "r:*") as tf:
+            for info in tf:                    # só os cabeçalhos, em sequência
+                if not info.isfile():
+                    continue
+                rel = accept(info.name)
+                if rel is None or not flt(rel):
+                    continue
+                entries.append(ScanEntry(rel, f"{path}/{rel}", info.size, info.mtime,
+                                         (reader, info)))
+    else:                                      # .gz de um arquivo só
+        rel = path.name[:-3]
+        if flt(rel):
+            with open(path, "rb") as f:        # tamanho original: últimos 4 bytes (ISIZE)
+                f.seek(-4, os.SEEK_END)
+                size = struct.unpack("<I", f.read(4))[0]
+            entries.append(ScanEntry(rel, f"{path}/{rel}", size, path.stat().st_mtime,
+                                     (ArchiveReader(path, "gz"), None)))
+    return entries
+
+
+def _scan_dir(root, rel_dir, flt):
+    """Uma pasta via os.scandir: (arquivos aceitos, subpastas a visitar)."""
+    files, subdirs = [], []
+    base = os.path.join(root, rel_dir) if rel_dir else root
+    prefix = rel_dir + "/" if rel_dir else ""
+    try:
+        it = os.scandir(base)
+    except OSError:
+        return files, subdirs
+    with it:
+        for entry in it:
+            rel = prefix + entry.name
+            try:
+                if entry.is_dir():
+                    if flt.recursive and flt.enter(rel):
+                        subdirs.append(rel)
+                elif flt(rel):
+                    st = entry.stat()
+                    files.append(ScanEntry(rel, entry.path, st.st_size, st.st_mtime))
+            except OSError:
+                continue
+    return files, subdirs
+
+
+SCAN_WORKERS = 4   # threads por nível na varredura recursiva (discos lentos/rede)
+
+
+def scan_directory(root, flt, workers=1):
+    """Percorre a pasta uma vez (em largura); com workers > 1, cada nível em paralelo."""
+    from concurrent import futures
+    root    = str(root)
+    entries = []
+    level   = [""]
+    pool    = futures.ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while level:
+            if pool is not None and len(level) > 1:
+                results = pool.map(lambda d: _scan_dir(root, d, flt), level)
+            else:
+                results = (_scan_dir(root, d, flt) for d in level)
+            nxt = []
+            for files, subdirs in results:
+                entries.extend(files)
+                nxt.extend(subdirs)
+            level = nxt
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return entries
+
+
+def scan_source(root, flt, workers=1, log=None):
+    """Arquivos aceitos pelo filtro numa pasta ou pacote, como ScanEntry."""
+    if is_archive(root):
+        return scan_archive(root, flt, log)
+    return scan_directory(root, flt, workers)
+
+
+def break_hard_link(path):
+    """Remove `path` se ele dividir o conteúdo com outro arquivo (hard link),
+    para que a regravação não altere o duplicado."""
+    try:
+        if path.stat().st_nlink > 1:
+            path.unlink()
+    except OSError:
+        pass
+
+
+class DirSink:
+    """Saída em pasta: um arquivo por C traduzido (cópias idênticas via hard link)."""
+    parallel = True     # arquivos diferentes podem ser gravados ao mesmo tempo
+
+    def __init__(self, root):
+        self.location = Path(root)
+
+    def exists(self, rel):
+        return (self.location / rel).exists()
+
+    def _target(self, rel):
+        """Caminho de saída de `rel`; OSError se ele ficar fora da pasta de saída."""
+        out_file = self.location / rel
+        try:
+            out_file.resolve().relative_to(self.location.resolve())
+        except ValueError:
+            raise OSError(f"caminho fora da pasta de saída: {rel}") from None
+        return out_file
+
+    def write(self, rel, data):
+        out_file = self._target(rel)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        break_hard_link(out_file)
+        with open(out_file, "wb") as f:
+            f.write(data)
+
+    def link(self, rel, src_rel, data):
+        """Grava `rel` igual a `src_rel` (já gravado): hard link se der, senão cópia."""
+        out_file = self._target(rel)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if out_file.exists():
+                out_file.unlink()
+            os.link(self.location / src_rel, out_file)
+        except OSError:
+            self.write(rel, data)
+
+    def add_file(self, name, path):
+        pass
+
+    def close(self):
+        pass
+
+
+def salvage_zip(path):
+    """Gera (nome, bytes) de cada entrada íntegra de um .zip sem diretório central.
+
+    É o que sobra de uma execução interrompida: os cabeçalhos locais são
+    percorridos em ordem e a leitura para na primeira entrada incompleta ou
+    com CRC errado.
+    """
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(30)
+            if len(head) < 30 or head[:4] != b"PK\x03\x04":
+                return
+            (flags, method, crc, csize, n_name, n_extra) = struct.unpack("<6xHH4xII4xHH", head)
+            if flags & 0x08 or csize == 0xFFFFFFFF or method not in (0, 8):
+                return      # tamanho só no descritor de dados / zip64 / sem suporte
+            name = f.read(n_name).decode("utf-8" if flags & 0x800 else "cp437")
+            f.seek(n_extra, 1)
+            body = f.read(csize)
+            if len(body) < csize:
+                return
+            try:
+                data = zlib.decompress(body, -15) if method == 8 else body
+            except zlib.error:
+                return
+            if zlib.crc32(data) != crc:
+                return
+            yield name, data
+
+
+class ZipSink:
+    """Saída num único .zip; `resume` acrescenta a um pacote de execução interrompida.
+
+    Se a execução anterior caiu antes de fechar o pacote (sem diretório
+    central), ele é refeito com as entradas que ainda podem ser lidas.
+    """
+    parallel = False    # ZipFile não aceita gravações simultâneas
+
+    def __init__(self, path, resume=False):
+        import zipfile
+        self.location = Path(path)
+        self._names   = set()
+        if not (resume and self.location.exists()):
+            self._zip = zipfile.ZipFile(self.location, "w", compression=zipfile.ZIP_DEFLATED)
+            return
+        # Modo "a" num arquivo sem diretório central não falha: começaria
+        # um pacote novo no fim e as entradas antigas se perderiam.
+        if zipfile.is_zipfile(self.location):
+            self._zip = zipfile.ZipFile(self.location, "a", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._rebuild()
+        self._names.update(self._zip.namelist())
+
+    def _rebuild(self):
+        import zipfile
+        broken = self.location.with_name(self.location.name + ".incompleto")
+        os.replace(self.location, broken)
+        self._zip = zipfile.ZipFile(self.location, "w", compression=zipfile.ZIP_DEFLATED)
+        for name, data in salvage_zip(broken):
+            self.write(name, data)
+        broken.unlink()
+
+    def exists(self, rel):
+        return rel in self._names
+
+    def write(self, rel, data):
+        if rel in self._names:
+            return          # já gravado (ex.: retomada): o .zip não substitui entradas
+        self._zip.writestr(rel, data)
+        self._names.add(rel)
+
+    def link(self, rel, src_rel, data):
+        self.write(rel, data)       # .zip não tem links: grava de novo
+
+    def add_file(self, name, path):
+        if name not in self._names:
+            self._zip.write(path, name)
+            self._names.add(name)
+
+    def close(self):
+        self._zip.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  OBSERVAÇÃO DE PASTAS
+# ─────────────────────────────────────────────────────────────────────────────
+WATCH_INTERVAL = 1.0    # segundos entre varreduras
+WATCH_QUIET    = 1.0    # segundos sem mudanças antes de entregar o lote
+
+
+class FolderWatcher:
+    """Observa pastas/pacotes por polling e entrega as mudanças em lotes.
+
+    Cada raiz vira um instantâneo {rel minúsculo: (tamanho, mtime)} feito com
+    o mesmo filtro da varredura; a diferença entre dois instantâneos dá os
+    arquivos criados, alterados ou removidos. Mudanças se acumulam até as
+    raízes ficarem `quiet` segundos paradas (debounce de salvamentos e cópias
+    em rajada) e então `on_batch({chave: set(rel)})` é chamado na thread do
+    observador. Pacotes só são relidos quando o próprio arquivo muda.
+    """
+
+    def __init__(self, roots, flt, on_batch, interval=WATCH_INTERVAL,
+                 quiet=WATCH_QUIET, on_error=None):
+        self.roots    = dict(roots)
+        self.flt      = flt
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.interval = interval
+        self.quiet    = quiet
+        self._stop    = threading.Event()
+        self._thread  = None
+        self._snap    = {}
+        self._stamp   = {}
+
+    def snapshot(self, key):
+        """Instantâneo atual de uma raiz; None se não der para ler agora."""
+        import tarfile
+        import zipfile
+        root = self.roots[key]
+        try:
+            if is_archive(root):
+                st    = os.stat(root)
+                stamp = (st.st_size, st.st_mtime)
+                if self._stamp.get(key) == stamp:
+                    return self._snap.get(key, {})
+                self._stamp[key] = stamp
+            entries = scan_source(root, self.flt,
+                                  SCAN_WORKERS if self.flt.recursive else 1)
+        except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            # Pacote sendo regravado ou pasta indisponível: tenta na próxima volta
+            self._stamp.pop(key, None)
+            if self.on_error:
+                self.on_error(key, e)
+            return None
+        return {e.rel.lower(): (e.size, e.mtime) for e in entries}
+
+    @staticmethod
+    def diff(old, new):
+        return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+    def start(self):
+        for key in self.roots:
+            self._snap[key] = self.snapshot(key) or {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    def _run(self):
+        pending = {key: set() for key in self.roots}
+        last    = None
+        while not self._stop.wait(self.interval):
+            changed = False
+            for key in self.roots:
+                snap = self.snapshot(key)
+                if snap is None:
+                    continue
+                d = self.diff(self._snap[key], snap)
+                if d:
+                    pending[key] |= d
+                    self._snap[key] = snap
+                    changed = True
+            now = time.monotonic()
+            if changed:
+                last = now
+            elif last is not None and now - last >= self.quiet:
+                batch, pending = pending, {key: set() for key in self.roots}
+                last = None
+                if not self._stop.is_set():
+                    self.on_batch(batch)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  SERVIDOR LOCAL DE TRADUÇÃO (dicionários sempre carregados)
+# ─────────────────────────────────────────────────────────────────────────────
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+FUZZY_MEMO  = 65536     # decisões fuzzy/falha lembradas pelo serviço
+
+
+class TranslationService:
+    """Dicionários já construídos prontos para traduzir linhas sob demanda.
+
+    Só lê os dicionários, então pode ser usado por várias threads ao mesmo
+    tempo. O dicionário de cada requisição segue as mesmas regras da
+    aplicação (único, por nome ou por caminho relativo); sem arquivo, usa o
+    dicionário único. Buscas que chegam ao fuzzy são caras e se repetem
+    muito entre requisições, então o resultado fica numa memória LRU.
+    """
+
+    def __init__(self, mapset, options):
+        self.mapset   = mapset.using(options)
+        self.options  = options
+        self.counters = Counter()
+        self._memo    = OrderedDict()
+        self._lock    = threading.Lock()
+
+    def dictionary_for(self, rel=None):
+        """ContentMap usado para o arquivo `rel`; None se não houver."""
+        return self.mapset.dictionary_for(rel)
+
+    def _find(self, look, s, tally):
+        val = look.mapping.get(s)
+        if val is not None:
+            return val, None, "exata"
+        if self.options.threshold >= 1.0:
+            return look.find(s)
+        # Pela impressão digital: dicionários sob demanda podem sair e voltar
+        key = (look.mapping.fingerprint(), s)
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                self._memo.move_to_end(key)
+        if hit is not None:
+            tally["memo_acertos"] += 1
+            return hit
+        tally["memo_faltas"] += 1
+        hit = look.find(s)
+        if hit[2] in ("fuzzy", "falha"):
+            with self._lock:
+                self._memo[key] = hit
+                if len(self._memo) > FUZZY_MEMO:
+                    self._memo.popitem(last=False)
+        return hit
+
+    def translate_lines(self, lines, rel=None):
+        """Lista de (linha traduzida, status, similaridade) para cada linha.
+
+        Mesmos status de MappingSet.translate_lines; as buscas fuzzy passam
+        pela memória do serviço.
+        """
+        tally = Counter()
+        out   = []
+        for res in self.mapset.translate_lines(
+                lines, rel, find=lambda look, s: self._find(look, s, tally)):
+            tally[res[1]] += 1
+            out.append(res)
+        with self._lock:
+            self.counters.update(tally)
+        return out
+
+    def translate_text(self, text, rel=None):
+        """Texto inteiro traduzido (linhas terminadas em \\n) e lista de problemas."""
+        source  = text.splitlines()
+        results = self.translate_lines(source, rel)
+        issues  = []
+        for idx, (src, (line, status, score)) in enumerate(zip(source, results), 1):
+            if status == "falha":
+                issues.append(f'L{idx}: [FALHA] "{src}"')
+            elif status == "fuzzy":
+                issues.append(f'L{idx}: [FUZZY {score*100:.0f}%] "{src}" → "{line}"')
+        return "".join(line + "\n" for line, _, _ in results), issues
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+        hits, misses = c.get("memo_acertos", 0), c.get("memo_faltas", 0)
+        lines = sum(n for k, n in c.items() if not k.startswith("memo_"))
+        found = lines - c.get("falha", 0)
+        return {"linhas": lines, "status": c,
+                "taxa_traduzidas": round(found / lines, 4) if lines else None,
+                "taxa_memo": round(hits / (hits + misses), 4) if hits + misses else None,
+                "memo_tamanho": len(self._memo)}
+
+
+class TranslationServer:
+    """Servidor HTTP local (só 127.0.0.1) sobre um TranslationService.
+
+        GET  /health              → {"ok": true}
+        GET  /stats               → requisições, latências (ms) e taxas de acerto
+        POST /translate/lines     {"file": rel?, "lines": [...]}
+             → {"lines": [...], "status": [...], "score": [...]}
+        POST /translate/file      {"file": rel?, "text": "..."}
+             → {"text": "...", "issues": [...]}
+
+    `service` é lido a cada requisição: trocar o atributo (após uma nova
+    construção) vale para as próximas sem derrubar as que estão em curso.
+    Cada conexão roda na sua própria thread. Um erro inesperado vira 500
+    com {"erro": ...}, vai para `log` e conta em "erros_internos".
+    """
+
+    def __init__(self, service, host=SERVER_HOST, port=SERVER_PORT, log=None):
+        self.service   = service
+        self.host      = host
+        self.port      = port
+        self.log       = log or _no_log
+        self.requests  = Counter()
+        self.latencies = deque(maxlen=10000)
+        self._lock     = threading.Lock()
+        self._httpd    = None
+
+    @property
+    def address(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Abre a porta (OSError se ocupada) e atende numa thread daemon."""
+        from http import server as http_server
+
+        class Server(http_server.ThreadingHTTPServer):
+            daemon_threads     = True
+            request_queue_size = 128     # padrão 5 recusa rajadas de clientes
+
+        self._httpd = Server((self.host, self.port), self._make_handler())
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def record(self, route, seconds, ok=True):
+        with self._lock:
+            self.requests[route] += 1
+            if not ok:
+                self.requests["erros"] += 1
+            self.latencies.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            lat   = sorted(self.latencies)
+            reqs  = dict(self.requests)
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3) if lat else None
+        return {"requisicoes": reqs,
+                "latencia_ms": {"p50": pct(0.50), "p90": pct(0.90), "p99": pct(0.99),
+                                "max": round(lat[-1] * 1000, 3) if lat else None},
+                "servico": self.service.stats()}
+
+    def handle(self, route, body):
+        """Atende uma rota; devolve (status HTTP, objeto JSON)."""
+        try:
+            return self._dispatch(route, body)
+        except Exception as e:
+            with self._lock:
+                self.requests["erros_internos"] += 1
+            self.log(f"Servidor local: erro em {route}: {type(e).__name__}: {e}", "ERROR")
+            return 500, {"erro": f"erro interno: {type(e).__name__}: {e}"}
+
+    def _dispatch(self, route, body):
+        if route == "/health":
+            return 200, {"ok": True}
+        if route == "/stats":
+            return 200, self.stats()
+        if route not in ("/translate/lines", "/translate/file"):
+            return 404, {"erro": f"rota desconhecida: {route}"}
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError as e:
+            return 400, {"erro": f"JSON inválido: {e}"}
+        if not isinstance(req, dict):
+            return 400, {"erro": "o corpo deve ser um objeto JSON"}
+        service = self.service
+        rel     = req.get("file")
+        if rel is not None and not isinstance(rel, str):
+            return 400, {"erro": "campo \"file\" deve ser texto"}
+        try:
+            if route == "/translate/lines":
+                lines = req.get("lines")
+                if not isinstance(lines, list):
+                    return 400, {"erro": "campo \"lines\" (lista) obrigatório"}
+                res = service.translate_lines([str(x) for x in lines], rel)
+                return 200, {"lines":  [r[0] for r in res],
+                             "status": [r[1] for r in res],
+                             "score":  [round(r[2], 4) for r in res]}
+            text = req.get("text")
+            if not isinstance(text, str):
+                return 400, {"erro": "campo \"text\" (texto) obrigatório"}
+            out, issues = service.translate_text(text, rel)
+            return 200, {"text": out, "issues": issues}
+        except KeyError:
+            return 404, {"erro": f"sem dicionário para {rel!r}"}
+
+    def _make_handler(self):
+        from http import server as http_server
+        server = self
+
+        class Handler(http_server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, body=None):
+                t0    = time.perf_counter()
+                route = self.path.split("?", 1)[0]
+                code, obj = server.handle(route, body)
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                server.record(route, time.perf_counter() - t0, code == 200)
+
+            def do_GET(self):
+                self._serve()
+
+            def do_POST(self):
+                try:
+                    n = max(0, int(self.headers.get("Content-Length") or 0))
+                except ValueError:
+                    n = 0
+                self._serve(self.rfile.read(n))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  VALIDAÇÃO POSICIONAL EM CAMADAS
+# ─────────────────────────────────────────────────────────────────────────────
+SIMILARITY_TIERS = ("igual", "comprimento", "quick", "ratio")
+
+
+def tiered_similarity(s, orig, threshold):
+    """Similaridade de s com orig decidida pela camada mais barata possível.
+
+    1. igualdade exata                   → 1.0
+    2. limite pelo comprimento           (= real_quick_ratio, sem difflib)
+    3. limite quick_ratio                (multiconjunto de caracteres)
+    4. SequenceMatcher.ratio() completo
+
+    Os limites 2 e 3 nunca são menores que ratio(); se já ficam abaixo do
+    limiar, a linha é rejeitada sem calcular a razão completa. Retorna
+    (sim, camada); nas camadas de limite, `sim` é o próprio limite.
+    """
+    if s == orig:
+        return 1.0, "igual"
+    la, lb = len(s), len(orig)
+    bound  = 2.0 * min(la, lb) / (la + lb)
+    if bound < threshold:
+        return bound, "comprimento"
+    sm    = difflib.SequenceMatcher(None, s, orig)
+    bound = sm.quick_ratio()
+    if bound < threshold:
+        return bound, "quick"
+    return sm.ratio(), "ratio"
+
+
+def positional_failure(idx, sim, tier):
+    """Linha do relatório para uma falha posicional.
+
+    Nas camadas de limite `sim` é só um teto da similaridade real, então o
+    percentual não é exibido.
+    """
+    if tier in ("comprimento", "quick"):
+        return f"L{idx}: [FALHA POSICIONAL abaixo do limiar]"
+    return f"L{idx}: [FALHA POSICIONAL {sim*100:.0f}%]"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  REALINHAMENTO POSICIONAL (alinhamento por âncoras, estilo patience diff)
+# ─────────────────────────────────────────────────────────────────────────────
+def _longest_increasing(pairs):
+    """Maior subsequência de `pairs` (i crescente) com j também crescente."""
+    tails, tails_idx = [], []
+    prev = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tails_idx.append(k)
+        else:
+            tails[pos]     = j
+            tails_idx[pos] = k
+        prev[k] = tails_idx[pos - 1] if pos else -1
+    out = []
+    k = tails_idx[-1] if tails_idx else -1
+    while k != -1:
+        out.append(pairs[k])
+        k = prev[k]
+    out.reverse()
+    return out
+
+
+def align_sequences(seq_c, seq_a):
+    """Alinha a sequência de C contra a de A numa passada.
+
+    Linhas iguais no início/fim de cada faixa e linhas únicas nas duas
+    faixas (na ordem da maior subsequência crescente) viram âncoras; o
+    intervalo entre âncoras é resolvido recursivamente e, quando não há
+    mais âncoras, pareado por posição dentro da lacuna. Retorna
+    match[i] = índice em A (ou None se a linha de C ficou sem par).
+    """
+    n, m  = len(seq_c), len(seq_a)
+    match = [None] * n
+    stack = [(0, n, 0, m)]
+    while stack:
+        c_lo, c_hi, a_lo, a_hi = stack.pop()
+        while c_lo < c_hi and a_lo < a_hi and seq_c[c_lo] == seq_a[a_lo]:
+            match[c_lo] = a_lo
+            c_lo += 1
+            a_lo += 1
+        while c_lo < c_hi and a_lo < a_hi and seq_c[c_hi - 1] == seq_a[a_hi - 1]:
+            c_hi -= 1
+            a_hi -= 1
+            match[c_hi] = a_hi
+        if c_lo == c_hi or a_lo == a_hi:
+            continue
+
+        count_c = Counter(seq_c[c_lo:c_hi])
+        count_a = Counter(seq_a[a_lo:a_hi])
+        pos_a   = {seq_a[j]: j for j in range(a_lo, a_hi) if count_a[seq_a[j]] == 1}
+        anchors = _longest_increasing(
+            [(i, pos_a[seq_c[i]]) for i in range(c_lo, c_hi)
+             if count_c[seq_c[i]] == 1 and seq_c[i] in pos_a])
+
+        if not anchors:
+            # Lacuna sem âncoras: pareia por posição (similaridade decide depois)
+            for k in range(min(c_hi - c_lo, a_hi - a_lo)):
+                match[c_lo + k] = a_lo + k
+            continue
+
+        prev_c, prev_a = c_lo, a_lo
+        for i, j in anchors:
+            match[i] = j
+            stack.append((prev_c, i, prev_a, j))
+            prev_c, prev_a = i + 1, j + 1
+        stack.append((prev_c, c_hi, prev_a, a_hi))
+    return match
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MOTOR DE MAPEAMENTO (API sem Tk: construir, traduzir linhas, aplicar)
+# ─────────────────────────────────────────────────────────────────────────────
+#  Uso embutido, sem janela:
+#
+#      opts   = MappingOptions(mode="content", threshold=0.9)
+#      mapset = build("A", "B", opts)
+#      for line, status, score in mapset.translate_lines(open("x.txt"), "x.txt"):
+#          ...
+#      for res in apply("C", mapset, opts, DirSink("C_TRA")):
+#          ...
+#
+#  Dicionário grande para vários processos: compacta uma vez e cada
+#  processo abre o mesmo arquivo (sem cópia nem desserialização):
+#
+#      pack_mapping(mapset.merged, "global.tmpk")     # no processo principal
+#      mapping = PackedMap("global.tmpk")             # em cada processo
+#
+#  A janela usa as mesmas funções nas threads de trabalho.
+
+APPLY_READ_AHEAD = 4    # arquivos de C lidos e decodificados à frente da tradução
+APPLY_WRITERS    = 2    # threads gravando as saídas (ZipSink grava com uma só)
+
+
+class MappingOptions:
+    """Configurações de construção e aplicação, sem dependência de Tk.
+
+    Os nomes seguem as opções da janela e todos têm padrão, então
+    MappingOptions(mode="phrases") já basta para uso embutido. Imutável:
+    use replace() para variar uma opção.
+    """
+
+    FIELDS = {
+        "mode":         "content",   # chave de MAPPING_MODES
+        "scan":         None,        # ScanFilter (None = .txt, com subpastas)
+        "ignore":       None,        # IgnoreRules
+        "normalizer":   None,        # TextNormalizer
+        "templates":    True,
+        "fmt":          None,        # chave de FORMAT_EXTRACTORS, "auto" ou None
+        "threshold":    1.0,         # 0..1; < 1 liga o fuzzy
+        "by_name":      False,
+        "brute_force":  False,
+        "unified":      False,
+        "validate":     True,
+        "realign":      False,
+        "encoding_ab":  "utf-8",     # reserva da detecção em A/B
+        "encoding_out": "utf-8",     # saída (e reserva da detecção em C)
+        "force_c":      False,       # lê C em encoding_out sem detectar
+        "byte_path":    False,
+        "lazy":         False,       # build só descobre os pares; cada um é lido no 1º uso
+    }
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **kw):
+        unknown = set(kw) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"opções desconhecidas: {', '.join(sorted(unknown))}")
+        values = {name: kw.get(name, default) for name, default in self.FIELDS.items()}
+        if values["scan"] is None:
+            values["scan"] = ScanFilter((".txt",))
+        if values["ignore"] is None:
+            values["ignore"] = IgnoreRules()
+        if values["normalizer"] is None:
+            values["normalizer"] = TextNormalizer()
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} é imutável (use replace)")
+
+    def replace(self, **kw):
+        """Cópia com as opções de `kw` trocadas."""
+        return type(self)(**{**{name: getattr(self, name) for name in self.FIELDS}, **kw})
+
+    @property
+    def extract_fmt(self):
+        """Formato de extração efetivo (o modo posicional é sempre por linha)."""
+        return self.fmt if self.mode != "positional" else None
+
+    @property
+    def force_encoding(self):
+        return self.encoding_out if self.force_c else None
+
+
+class JobConfig:
+    """Retrato imutável de uma execução: pastas, MappingOptions e saída.
+
+    Tirado da janela quando a execução começa; as threads de trabalho só
+    leem daqui, então mexer nas opções durante a execução só vale para a
+    próxima. É o que o checkpoint compara e o que abre o relatório.
+    """
+    __slots__ = ("folder_a", "folder_b", "folder_c", "options", "zip_output",
+                 "format_label", "profile", "track_memory", "decision_cache",
+                 "read_ahead", "writers")
+
+    def __init__(self, folder_a="", folder_b="", folder_c="", options=None,
+                 zip_output=False, format_label="", profile=False, track_memory=False,
+                 decision_cache=False, read_ahead=APPLY_READ_AHEAD, writers=APPLY_WRITERS):
+        values = {"folder_a": folder_a, "folder_b": folder_b, "folder_c": folder_c,
+                  "options": options or MappingOptions(), "zip_output": zip_output,
+                  "format_label": format_label, "profile": profile,
+                  "track_memory": track_memory, "decision_cache": decision_cache,
+                  "read_ahead": read_ahead, "writers": writers}
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} é imutável")
+
+    @property
+    def realign(self):
+        return self.options.mode == "positional" and self.options.realign
+
+    def settings(self):
+        """Configurações que um checkpoint precisa repetir para ser retomado."""
+        o = self.options
+        return {
+            "folder_a": self.folder_a, "folder_b": self.folder_b,
+            "folder_c": self.folder_c, "scan": o.scan.describe(),
+            "mode": o.mode, "by_name": o.by_name, "threshold": o.threshold,
+            "brute_force": o.brute_force, "unified": o.unified,
+            "prefixes": list(o.ignore.prefixes),
+            "regex": o.ignore.patterns, "normalize": list(o.normalizer.key),
+            "templates": o.templates, "format": o.extract_fmt,
+            "validate": o.validate, "realign": self.realign,
+            "encoding_ab": o.encoding_ab, "encoding_out": o.encoding_out,
+            "force_c": o.force_c, "zip_output": self.zip_output,
+        }
+
+    def report_header(self, mapset, n_files, out_name):
+        """Linhas de configuração do cabeçalho do relatório (`mapset` é a versão usada)."""
+        o = self.options
+        validate_str = "Sim" if o.validate else "Não"
+        if self.realign:
+            validate_str += " | Realinhar: Sim"
+        lines = [
+            f"Modo: {o.mode.capitalize()} | Validar: {validate_str} | "
+            f"Limiar: {o.threshold*100:.0f}% | Busca: {'Nome' if o.by_name else 'Estrutura'}",
+            f"Brute Force: {'Sim' if o.brute_force else 'Não'} | "
+            f"Dicionário Único: {'Sim' if o.unified else 'Não'} | "
+            f"Ignorar Prefixos: {' '.join(o.ignore.prefixes) or 'Nenhum'}",
+        ]
+        if o.ignore.patterns or o.normalizer.active or o.templates or o.extract_fmt:
+            lines.append(f"Ignorar Regex: {' '.join(o.ignore.patterns) or 'Nenhuma'} | "
+                         f"Normalização: {o.normalizer.describe()} | "
+                         f"Modelos: {'Sim' if o.templates else 'Não'} | "
+                         f"Formato: {self.format_label if o.extract_fmt else 'Linhas'}")
+        snapshot = dict(self.settings(), byte_path=o.byte_path, lazy=o.lazy,
+                        decision_cache=self.decision_cache,
+                        read_ahead=self.read_ahead, writers=self.writers)
+        lines += [f"A/B mapeados: {len(mapset.ordered)} (versão {mapset.version}) | "
+                  f"C processados: {n_files}",
+                  f"Codificação A/B: {o.encoding_ab} | Saída: {o.encoding_out}",
+                  f"Pasta de Saída: {out_name}",
+                  f"Arquivos: {o.scan.describe()}",
+                  f"Configuração: {json.dumps(snapshot, ensure_ascii=False, sort_keys=True)}"]
+        return lines
+
+
+def _no_log(message, level="INFO"):
+    pass
+
+
+def scan_root(root, flt, log=None):
+    """scan_source com tempo no log; erro de pacote/pasta vira lista vazia."""
+    import tarfile
+    import zipfile
+    log = log or _no_log
+    t0 = time.perf_counter()
+    try:
+        entries = scan_source(root, flt, SCAN_WORKERS if flt.recursive else 1, log)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        log(f"Erro ao ler {root}: {e}", "ERROR")
+        return []
+    dt = time.perf_counter() - t0
+    log(f"Varredura de {Path(root).name}: {len(entries)} arquivo(s) em {dt:.3f}s", "DIM")
+    return entries
+
+
+def scan_targets(folder_c, options, log=None):
+    """Arquivos de C na ordem de aplicação (nome, depois caminho)."""
+    return sorted(scan_root(folder_c, options.scan, log),
+                  key=lambda e: (e.name.lower(), e.rel.lower()))
+
+
+def decode_raw(raw, fallback, stats=None):
+    """Decodifica bytes (BOM → chardet → tentativas). Devolve (texto, encoding usado);
+    encoding None quando só deu para decodificar com substituição de erros."""
+    pc = time.perf_counter
+    bom_map = {b"\xef\xbb\xbf": "utf-8-sig",
+               b"\xff\xfe":     "utf-16-le",
+               b"\xfe\xff":     "utf-16-be"}
+    t0 = pc()
+    for bom, enc in bom_map.items():
+        if raw.startswith(bom):
+            try:
+                text = raw.decode(enc)
+                if stats is not None: stats.add("decode", pc() - t0)
+                return text, enc
+            except: pass
+
+    t0 = pc()
+    detector = chardet.UniversalDetector()
+    for line in raw.splitlines(keepends=True)[:200]:
+        detector.feed(line)
+        if detector.done: break
+    detector.close()
+    if stats is not None: stats.add("detect", pc() - t0)
+
+    t0 = pc()
+    try:
+        if detector.result["encoding"] and detector.result["confidence"] > 0.8:
+            try: return raw.decode(detector.result["encoding"]), detector.result["encoding"]
+            except: pass
+
+        for enc in ["utf-8", "cp1252", "utf-16", "latin-1", fallback.lower()]:
+            try: return raw.decode(enc), enc
+            except: continue
+
+        return raw.decode("utf-8", errors="replace"), None
+    finally:
+        if stats is not None: stats.add("decode", pc() - t0)
+
+
+def read_lines(path, fallback, force_encoding=None, stats=None, log=None):
+    """Linhas (com terminador) de um arquivo ou membro de pacote."""
+    pc = time.perf_counter
+    t0 = pc()
+    try:
+        raw = path.read_bytes()        # Path ou membro de pacote
+        if force_encoding is not None:
+            # Igual a open(..., "r"): newlines universais
+            text  = raw.decode(force_encoding).replace("\r\n", "\n").replace("\r", "\n")
+            lines = text.splitlines(keepends=True)
+            if stats is not None:
+                stats.add("read", pc() - t0)
+                stats.count("bytes_lidos", len(raw))
+            return lines
+    except Exception as e:
+        (log or _no_log)(f"Erro ao ler {path}: {e}", "ERROR")
+        return ["<ERRO>\n"]
+    if stats is not None:
+        stats.add("read", pc() - t0)
+        stats.count("bytes_lidos", len(raw))
+
+    if not raw: return ["\n"]
+    text, _ = decode_raw(raw, fallback, stats)
+    return text.splitlines(keepends=True)
+
+
+def read_for_bytes(path, fallback, out_encoding, force_encoding=None, stats=None,
+                   log=None):
+    """Leitura de C para o caminho binário.
+
+    Devolve (raw, encoding) quando os bytes podem ser usados diretamente
+    (mesma codificação da saída; ver bytes_compatible); senão (linhas, None)
+    com as mesmas linhas que read_lines devolveria.
+    """
+    pc = time.perf_counter
+    t0 = pc()
+    try:
+        raw = path.read_bytes()
+    except Exception:
+        return read_lines(path, fallback, force_encoding, stats, log), None
+    if stats is not None:
+        stats.add("read", pc() - t0)
+        stats.count("bytes_lidos", len(raw))
+    if not raw:
+        # Como read_lines: vazio decodificado à força não tem linhas
+        return ([] if force_encoding is not None else ["\n"]), None
+
+    if force_encoding is not None:
+        t0 = pc()
+        try:
+            text = raw.decode(force_encoding)
+        except Exception:
+            # Mesmo tratamento de erro do leitor de texto
+            return read_lines(path, fallback, force_encoding, log=log), None
+        finally:
+            if stats is not None: stats.add("decode", pc() - t0)
+        enc = force_encoding
+    else:
+        text, enc = decode_raw(raw, fallback, stats)
+
+    if bytes_compatible(enc, out_encoding, text):
+        return raw, enc
+    if force_encoding is not None:
+        # open(..., "r") traduz \r\n e \r para \n (newlines universais)
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.splitlines(keepends=True), None
+
+
+def as_content_map(mapping):
+    """Pares posicionais ([{"orig", "trans"}]) como ContentMap."""
+    content_map = ContentMap()
+    for item in mapping:
+        if item["trans"] is not None:
+            v = item["trans"]
+            content_map[item["orig"]] = v + "\n" if not v.endswith("\n") else v
+    return content_map
+
+
+def load_pair(file_a, file_b, rel, options, stats, log=None, memprof=None):
+    """Lê um par A/B e monta o dicionário dele: (dicionário, nº de pares).
+
+    ContentMap com os índices das opções já prontos, ou a lista de pares
+    {"orig", "trans"} no modo posicional.
+    """
+    pc        = time.perf_counter
+    ignore    = options.ignore
+    lines_a = read_lines(file_a, options.encoding_ab, stats=stats, log=log)
+    lines_b = read_lines(file_b, options.encoding_ab, stats=stats, log=log)
+    if memprof: memprof.note_lines(rel, lines_a, lines_b)
+
+    t_ign     = 0.0
+    mapping   = []
+    extractor = extractor_for(options.extract_fmt, rel)
+    for la, lb in zip(lines_a, lines_b):
+        orig  = la.rstrip("\n\r")
+        trans = lb.rstrip("\n\r")
+        if ignore:
+            t0  = pc()
+            ign = ignore(orig)
+            t_ign += pc() - t0
+            if ign:
+                stats.count("ignoradas")
+                continue
+        if extractor is None:
+            mapping.append({"orig": orig, "trans": trans})
+            continue
+        pairs = extract_pairs(extractor, orig, trans)
+        if pairs is None:
+            stats.count("formato_divergente")
+            continue
+        for o, t in pairs:
+            mapping.append({"orig": o, "trans": t})
+    stats.add("ignore", t_ign)
+
+    t0 = pc()
+    if options.mode != "positional":
+        content_map = as_content_map(mapping)
+        if options.mode == "phrases":
+            content_map.phrases()
+        else:
+            if options.normalizer.active:
+                content_map.normalized_for(options.normalizer)
+            if options.templates:
+                content_map.templates_for(options.normalizer)
+        result = content_map
+    else:
+        result = mapping
+    stats.add("index", pc() - t0)
+    return result, len(mapping)
+
+
+LAZY_CACHE_SIZE = 64    # dicionários por arquivo mantidos carregados (build sob demanda)
+
+
+class PendingPair:
+    """Par A/B já descoberto e ainda não lido (build com `lazy`).
+
+    Fica no lugar do dicionário em MappingSet; é a própria identidade do
+    dicionário (deduplicação, cache LRU) enquanto ele não é carregado.
+    """
+    __slots__ = ("rel", "file_a", "file_b", "options")
+
+    def __init__(self, rel, file_a, file_b, options):
+        self.rel    = rel
+        self.file_a = file_a
+        self.file_b = file_b
+        self.options = options
+
+
+class MappingSet:
+    """Dicionários construídos a partir de A/B.
+
+    mappings  rel minúsculo → ContentMap (lista de pares no modo posicional)
+    by_name   nome minúsculo → primeiro dicionário com esse nome
+    ordered   dicionários na ordem dos arquivos (Brute Force)
+    merged    dicionário único com todos os pares (conteúdo e frases)
+    rels      rel minúsculo → rel como está no disco
+
+    Num build sob demanda (`lazy`) os dicionários por arquivo são
+    PendingPair: dictionary_for lê o par no primeiro uso e mantém os
+    últimos `cache_size` carregados (LRU); o dicionário único só é montado
+    se alguém pedir por ele (servidor sem arquivo, Dicionário Único).
+
+    build() devolve o conjunto congelado (freeze): com número de versão e
+    só leitura, ele é publicado trocando uma referência, e quem já o pegou
+    (uma aplicação, o servidor, a prévia) segue nessa versão enquanto uma
+    nova é construída ao lado.
+    """
+    _versions = itertools.count(1)
+
+    def __init__(self, options=None):
+        self.options  = options or MappingOptions()
+        self.mappings = {}
+        self.by_name  = {}
+        self.ordered  = []
+        self.merged   = ContentMap()
+        self.rels     = {}
+        self.complete = True
+        self.version  = 0
+        self.frozen   = False
+        self.lazy     = False
+        self.cache_size = LAZY_CACHE_SIZE
+        self._loaded  = OrderedDict()   # PendingPair → dicionário carregado
+        self._loading = {}              # PendingPair (None: dicionário único) → Future da leitura em curso
+        self._lookups = {}
+        self._lock    = threading.Lock()
+
+    def __len__(self):
+        return len(self.mappings)
+
+    def copy(self):
+        """Cópia rasa (mesmos dicionários por arquivo) para uma reconstrução parcial."""
+        new = MappingSet(self.options)
+        new.mappings = dict(self.mappings)
+        new.rels     = dict(self.rels)
+        new.lazy     = self.lazy
+        new._loaded  = OrderedDict(self._loaded)
+        new.rebuild()
+        return new
+
+    def using(self, options):
+        """Mesmos dicionários, regras de aplicação de `options`."""
+        view = MappingSet(options)
+        view.mappings, view.by_name = self.mappings, self.by_name
+        view.ordered,  view.merged  = self.ordered,  self.merged
+        view.rels,     view.complete = self.rels,    self.complete
+        view.version,  view.frozen   = self.version, self.frozen
+        view.lazy,     view.cache_size = self.lazy,  self.cache_size
+        view._loaded,  view._loading = self._loaded, self._loading
+        view._lookups, view._lock    = self._lookups, self._lock
+        return view
+
+    def freeze(self):
+        """Numera a versão e fecha o conjunto para mudanças; devolve self."""
+        self.ordered = tuple(self.ordered)
+        self.version = next(MappingSet._versions)
+        self.frozen  = True
+        return self
+
+    def _check_mutable(self):
+        if self.frozen:
+            raise RuntimeError(f"dicionários v{self.version} já publicados são só leitura")
+
+    def add(self, rel, mapping):
+        self._check_mutable()
+        rel_lower = rel.lower()
+        self.mappings[rel_lower] = mapping
+        self.rels[rel_lower]     = rel
+
+    def discard(self, rel_lower):
+        self._check_mutable()
+        self.mappings.pop(rel_lower, None)
+        self.rels.pop(rel_lower, None)
+
+    def rebuild(self):
+        """Recalcula lista, índice por nome e dicionário único a partir de `mappings`."""
+        self._check_mutable()
+        keys    = sorted(self.mappings, key=str.lower)
+        ordered = [self.mappings[k] for k in keys]
+        by_name = {}
+        for k in keys:
+            by_name.setdefault(Path(k).name, self.mappings[k])
+        merged = ContentMap()
+        if self.options.mode != "positional" and not self.lazy:
+            for m in ordered:
+                merged.update(self.resolve(m))
+        self.ordered, self.by_name, self.merged = ordered, by_name, merged
+        self._lookups = {}
+        live = {id(m) for m in ordered}
+        for pending in [p for p in self._loaded if id(p) not in live]:
+            del self._loaded[pending]
+
+    def prepare(self, stats=None):
+        """Monta de antemão os índices do dicionário único."""
+        o     = self.options
+        stats = stats if stats is not None else RunStats("Índices")
+        with stats.timer("index"):
+            if o.mode == "content" and o.normalizer.active:
+                self.merged.normalized_for(o.normalizer)
+            if o.mode == "content" and o.templates:
+                self.merged.templates_for(o.normalizer)
+            if o.mode == "phrases" and len(self.ordered) > 1:
+                self.merged.phrases()
+
+    def containers(self):
+        """Contêineres, na ordem usada pela contabilidade de memória."""
+        return [("mappings",         self.mappings),
+                ("mappings_by_name", self.by_name),
+                ("mappings_list",    self.ordered),
+                ("global_mapping",   self.merged)]
+
+    def entry_for(self, rel=None, index=None):
+        """Como dictionary_for, mas sem carregar: pode devolver um PendingPair."""
+        o = self.options
+        if not rel or o.unified:
+            return self.unified() or None
+        if o.brute_force and index is not None:
+            return self.ordered[index] if index < len(self.ordered) else None
+        rel_lower = rel.replace("\\", "/").lower()
+        if o.by_name:
+            return self.by_name.get(rel_lower.rsplit("/", 1)[-1])
+        return self.mappings.get(rel_lower)
+
+    def dictionary_for(self, rel=None, index=None, stats=None):
+        """Dicionário do arquivo `rel` (posição `index` em C); None se não houver.
+
+        Sem `rel` (ou com Dicionário Único) é o dicionário único; Brute Force
+        usa a posição; senão o nome ou o caminho relativo.
+        """
+        return self.resolve(self.entry_for(rel, index), stats)
+
+    def resolve(self, entry, stats=None):
+        """Dicionário de `entry`; um PendingPair é lido agora ou vem do cache LRU.
+
+        A leitura acontece fora do lock: quem pede o mesmo par enquanto ele
+        é lido espera pela mesma leitura, e os demais pedidos seguem livres.
+        """
+        if not isinstance(entry, PendingPair):
+            return entry
+        from concurrent import futures
+        with self._lock:
+            mapping = self._loaded.get(entry)
+            if mapping is not None:
+                self._loaded.move_to_end(entry)
+                return mapping
+            pending = self._loading.get(entry)
+            owner   = pending is None
+            if owner:
+                pending = self._loading[entry] = futures.Future()
+        if not owner:
+            return pending.result()
+        t0 = time.perf_counter()
+        try:
+            mapping, _ = load_pair(entry.file_a, entry.file_b, entry.rel, entry.options,
+                                   RunStats(entry.rel))
+        except BaseException as e:
+            with self._lock:
+                del self._loading[entry]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[entry]
+            self._loaded[entry] = mapping
+            while len(self._loaded) > self.cache_size:
+                _, old = self._loaded.popitem(last=False)
+                for key in [k for k in self._lookups if k[0] == id(old)]:
+                    del self._lookups[key]
+        pending.set_result(mapping)
+        if stats is not None:
+            stats.add("load", time.perf_counter() - t0)
+            stats.count("dicionarios_carregados")
+        return mapping
+
+    def unified(self):
+        """Dicionário único; num build sob demanda, lê todos os pares no primeiro pedido.
+
+        É preenchido no lugar, então as visões de using() também o enxergam.
+        Como em resolve(), a leitura é feita fora do lock e uma só por vez.
+        """
+        if not (self.lazy and not self.merged and self.ordered
+                and self.options.mode != "positional"):
+            return self.merged
+        from concurrent import futures
+        with self._lock:
+            if self.merged:
+                return self.merged
+            pending = self._loading.get(None)
+            owner   = pending is None
+            if owner:
+                pending = self._loading[None] = futures.Future()
+        if not owner:
+            pending.result()
+            return self.merged
+        try:
+            merged = ContentMap()
+            for m in self.ordered:
+                if isinstance(m, PendingPair):
+                    with self._lock:
+                        loaded = self._loaded.get(m)
+                    if loaded is None:
+                        loaded, _ = load_pair(m.file_a, m.file_b, m.rel, m.options,
+                                              RunStats(m.rel))
+                    m = loaded
+                merged.update(m)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[None]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self.merged.update(merged)
+            del self._loading[None]
+        pending.set_result(self.merged)
+        return self.merged
+
+    def get(self, rel_lower):
+        """Dicionário do par `rel_lower` (carregado se preciso); None se não houver."""
+        return self.resolve(self.mappings.get(rel_lower))
+
+    def lookup_for(self, mapping, stats=None, decisions=None):
+        """ContentLookup de um dicionário (reaproveitado entre chamadas sem stats).
+
+        O cache é dividido entre as visões de using(), então a chave leva as
+        opções que mudam a busca.
+        """
+        o = self.options
+        if stats is not None:
+            return ContentLookup(mapping, o.normalizer, o.templates, o.threshold, stats,
+                                 decisions)
+        key  = (id(mapping), o.normalizer.key, o.templates, o.threshold)
+        look = self._lookups.get(key)
+        if look is None:
+            with self._lock:
+                look = self._lookups.get(key)
+                if look is None:
+                    look = ContentLookup(mapping, o.normalizer, o.templates, o.threshold)
+                    self._lookups[key] = look
+        return look
+
+    def translate_lines(self, lines, rel=None, index=None, find=None):
+        """Gera (linha traduzida, status, similaridade) para cada linha de `lines`.
+
+        Aceita qualquer iterável (arquivo aberto, lista, gerador) e traduz à
+        medida que consome; as linhas saem sem terminador. Status: "vazia",
+        "ignorada", "exata", "normalizada", "modelo", "fuzzy", "falha",
+        "fora_de_indice" ou, no modo frases, "frases"/"inalterada".
+        `find(look, s)` substitui a busca do modo conteúdo.
+        KeyError se não houver dicionário para `rel`.
+        """
+        o       = self.options
+        mapping = self.dictionary_for(rel, index)
+        if mapping is None:
+            raise KeyError(rel or "(dicionário único)")
+        ignore    = o.ignore
+        extractor = extractor_for(o.extract_fmt, rel or "")
+        if o.mode == "positional":
+            yield from self._translate_positional(lines, mapping)
+            return
+        if isinstance(mapping, list):
+            mapping = as_content_map(mapping)
+        if o.mode == "phrases":
+            matcher = mapping.phrases()
+        else:
+            look = self.lookup_for(mapping)
+            if find is None:
+                find = ContentLookup.find
+        for line in lines:
+            s = line.rstrip("\r\n")
+            if not s:
+                yield s, "vazia", 1.0
+            elif ignore and ignore(s):
+                yield s, "ignorada", 1.0
+            elif o.mode == "phrases":
+                if extractor is None:
+                    s2, k = matcher.replace(s)
+                else:
+                    parts, pos, k = [], 0, 0
+                    for a, b in extractor(s):
+                        text, n = matcher.replace(s[a:b])
+                        parts.append(s[pos:a]); parts.append(text)
+                        k  += n
+                        pos = b
+                    parts.append(s[pos:])
+                    s2 = "".join(parts)
+                yield s2, "frases" if k else "inalterada", 1.0
+            else:
+                spans = [(0, len(s))] if extractor is None else extractor(s)
+                parts, pos, status, score = [], 0, "exata", 1.0
+                for a, b in spans:
+                    text = s[a:b]
+                    val, best, kind = find(look, text)
+                    parts.append(s[pos:a])
+                    if val is None:
+                        parts.append(text)
+                        status, score = "falha", 0.0
+                    else:
+                        parts.append(val.rstrip("\r\n"))
+                        if best is not None:
+                            score = min(score, difflib.SequenceMatcher(None, text, best).ratio())
+                        if status != "falha" and kind != "exata":
+                            status = kind
+                    pos = b
+                parts.append(s[pos:])
+                yield "".join(parts), status, score
+
+    def _translate_positional(self, lines, mapping):
+        o = self.options
+        if isinstance(mapping, dict):
+            mapping = [{"orig": k, "trans": v} for k, v in mapping.items()]
+        pair = None
+        if o.realign:
+            # Alinhamento precisa do arquivo inteiro
+            lines = list(lines)
+            pair  = [False] * len(lines)
+            c_keys, c_pos = [], []
+            for k, line in enumerate(lines):
+                if o.ignore and o.ignore(line):
+                    continue
+                c_keys.append(line.strip())
+                c_pos.append(k)
+            a_keys = [item["orig"].strip() if item["orig"] else "" for item in mapping]
+            for k, j in zip(c_pos, align_sequences(c_keys, a_keys)):
+                pair[k] = j
+        for idx, line in enumerate(lines):
+            s = line.rstrip("\r\n")
+            if not s:
+                yield s, "vazia", 1.0; continue
+            j = idx if pair is None else pair[idx]
+            if j is False or (pair is None and o.ignore and o.ignore(s)):
+                yield s, "ignorada", 1.0; continue
+            if j is None or j >= len(mapping):
+                yield s, "fora_de_indice", 0.0; continue
+            item = mapping[j]
+            out  = (item["trans"] or s).rstrip("\r\n")
+            if not o.validate:
+                yield out, "exata", 1.0; continue
+            orig_s = item["orig"].strip() if item["orig"] else ""
+            sim, tier = tiered_similarity(s, orig_s, o.threshold)
+            if sim < o.threshold:
+                if tier in ("comprimento", "quick"):
+                    # O pré-filtro só dá um teto; quem chama recebe a similaridade real
+                    sim = difflib.SequenceMatcher(None, s, orig_s).ratio()
+                yield s, "falha", sim
+            else:
+                yield out, "exata" if sim >= 1.0 else "fuzzy", sim
+
+
+def build(folder_a, folder_b, options, progress=None, token=None, stats=None,
+          log=None, only=None, base=None, memprof=None):
+    """Constrói os dicionários A↔B e devolve um MappingSet.
+
+    `progress(feitos, total, rel)` é chamado no início (rel None) e após
+    cada par. Com `only` (rel minúsculos) refaz só esses pares sobre uma
+    cópia de `base`; pares que sumiram de A ou B saem. O resultado vem
+    congelado (ver MappingSet.freeze); se `token` for cancelado, devolve o
+    que foi feito, sem congelar e com `complete = False`.
+
+    Com `options.lazy` (e sem Dicionário Único) os pares só são descobertos:
+    cada dicionário é lido quando a aplicação ou a prévia pedir por ele.
+    """
+    stats      = stats if stats is not None else RunStats("Construção")
+    token      = token or CancelToken()
+    lazy       = options.lazy and not options.unified
+
+    with stats.timer("scan"):
+        files_a = {e.rel.lower(): e for e in scan_root(folder_a, options.scan, log)}
+        files_b = {e.rel.lower(): e for e in scan_root(folder_b, options.scan, log)}
+    if memprof: memprof.snapshot("varredura")
+
+    common = sorted(set(files_a.keys()) & set(files_b.keys()), key=str.lower)
+    if only is not None and base is not None:
+        # Parcial: só os pares alterados; os que sumiram saem do dicionário
+        mapset = base.copy()
+        mapset.options = options
+        for gone in only.difference(common):
+            mapset.discard(gone)
+        common = [k for k in common if k in only]
+    else:
+        mapset = MappingSet(options)
+    mapset.lazy = lazy
+    total  = len(common)
+    sizes  = {k: files_a[k].size + files_b[k].size for k in common}
+    stats.total_files = total
+    stats.total_bytes = sum(sizes.values())
+    if progress: progress(0, total, None)
+
+    if lazy:
+        for rel_lower in common:
+            rel = files_a[rel_lower].rel
+            mapset.add(rel, PendingPair(rel, files_a[rel_lower], files_b[rel_lower], options))
+        stats.count("pares_descobertos", total)
+        common = []
+        if progress: progress(total, total, None)
+
+    for i, rel_lower in enumerate(common):
+        if token.cancelled:
+            break
+        rel = files_a[rel_lower].rel
+        stats.begin_file(rel, sizes[rel_lower])
+        mapping, n_pairs = load_pair(files_a[rel_lower], files_b[rel_lower], rel, options,
+                                     stats, log, memprof)
+        mapset.add(rel, mapping)
+        stats.count("arquivos")
+        stats.count("linhas", n_pairs)
+        stats.end_file()
+        if progress: progress(i + 1, total, rel)
+
+    mapset.complete = not token.cancelled
+    with stats.timer("index"):
+        mapset.rebuild()
+    mapset.prepare(stats)
+    if mapset.complete:
+        mapset.freeze()
+    return mapset
+
+
+class FileResult:
+    """Resultado de um arquivo de C: problemas, frases trocadas e saída.
+
+    `data` (bytes da saída) só é guardado quando não há destino de gravação.
+    `resumed` marca arquivos pulados por já estarem num checkpoint e
+    `same_as` o arquivo idêntico cuja tradução foi reaproveitada.
+    """
+    __slots__ = ("rel", "ok", "issues", "phrases", "resumed", "data", "same_as")
+
+    def __init__(self, rel, ok, issues, phrases=0, resumed=False, data=None, same_as=None):
+        self.rel     = rel
+        self.ok      = ok
+        self.issues  = issues
+        self.phrases = phrases
+        self.resumed = resumed
+        self.data    = data
+        self.same_as = same_as
+
+
+def content_digests(entries, stats=None):
+    """rel → hash do conteúdo, só dos arquivos que têm outro do mesmo tamanho.
+
+    O tamanho é o filtro barato: arquivo de tamanho único não pode ter
+    cópia idêntica e nem chega a ser lido aqui.
+    """
+    by_size = {}
+    for e in entries:
+        by_size.setdefault(e.size, []).append(e)
+    digests = {}
+    t0 = time.perf_counter()
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        for e in group:
+            try:
+                digests[e.rel] = hashlib.blake2b(e.read_bytes(), digest_size=16).digest()
+            except OSError:
+                pass
+    if stats is not None and digests:
+        stats.add("hash", time.perf_counter() - t0)
+    return digests
+
+
+def encode_output(output, byte_enc, out_enc):
+    """Bytes finais de um arquivo traduzido (mesmo resultado de writelines em texto)."""
+    if byte_enc is not None:
+        return b"".join(output)
+    text = "".join(output)
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode(out_enc)
+
+
+def load_source(entry, mapping, options, stats=None, log=None):
+    """Lê e decodifica um arquivo de C: (linhas, encoding binário ou None).
+
+    No caminho binário (conteúdo por linha inteira, C já na codificação da
+    saída) as linhas são bytes; ver read_for_bytes.
+    """
+    o = options
+    if (o.byte_path and o.mode == "content" and isinstance(mapping, ContentIndexes)
+            and mapping and extractor_for(o.extract_fmt, entry.rel) is None):
+        lines_c, byte_enc = read_for_bytes(entry, o.encoding_out, o.encoding_out,
+                                           o.force_encoding, stats=stats, log=log)
+        if byte_enc is not None:
+            lines_c = lines_c.splitlines(keepends=True)
+            if stats is not None:
+                stats.count("arquivos_bytes")
+        return lines_c, byte_enc
+    return read_lines(entry, o.encoding_out, o.force_encoding, stats=stats, log=log), None
+
+
+def translate_file(entry, index, mapset, stats, token=None, log=None, memprof=None,
+                   cache=None, loaded=None):
+    """Traduz um arquivo de C com as regras de `mapset.options`.
+
+    Devolve (saída, encoding binário ou None, falhas, fuzzy, nº de frases);
+    a saída é uma lista de str (ou de bytes no caminho binário). None se o
+    token for cancelado no meio do arquivo. `cache` (DecisionCache) guarda
+    e reaproveita as decisões do fuzzy no modo conteúdo; `loaded` é o
+    resultado de load_source já lido à frente (senão o arquivo é lido aqui).
+    """
+    o          = mapset.options
+    log        = log or _no_log
+    token      = token or CancelToken()
+    pc         = time.perf_counter
+    rel        = entry.rel
+    mode       = o.mode
+    ignore     = o.ignore
+    threshold  = o.threshold
+    validate   = o.validate
+    realign    = mode == "positional" and o.realign
+    fmt        = o.extract_fmt
+    out_enc    = o.encoding_out
+    force_enc_c = o.force_encoding
+
+    mapping = mapset.dictionary_for(rel, index if o.brute_force else None, stats)
+    if not mapping:
+        mapping = None
+        if o.unified:
+            log(f"Dicionário único vazio! Reconstrua os mapeamentos.", "ERROR")
+        elif o.brute_force:
+            log(f"Sem mapeamento para '{rel}' (índice {index})", "WARN")
+
+    if loaded is None:
+        loaded = load_source(entry, mapping, o, stats, log)
+    lines_c, byte_enc = loaded
+    if memprof: memprof.note_lines(rel, lines_c)
+    output, issues_fail, issues_fuzzy = [], [], []
+    n_sub  = 0
+    t_loop = pc()
+    t_ign = t_fuzzy = t_align = 0.0
+    tiers = dict.fromkeys(SIMILARITY_TIERS, 0)
+    n_exact = 0
+    n_tmpl  = 0         # acertos por modelo: traduzidos, contam à parte
+
+    if not mapping:
+        output = [line.rstrip("\r\n") + "\n" for line in lines_c]
+        issues_fail.append("[!] Sem mapeamento encontrado.")
+    else:
+        if mode != "positional" and isinstance(mapping, list):
+            mapping = as_content_map(mapping)
+        extractor = extractor_for(fmt, rel)
+        if mode == "content":
+            decisions = None
+            if cache is not None and threshold < 1.0:
+                decisions = cache.decisions_for(mapping, mode, threshold, o.normalizer)
+            look = mapset.lookup_for(mapping, stats, decisions)
+
+            def find(s):
+                """(tradução, chave fuzzy ou None, tipo) de `s`; tradução None se falhar."""
+                return look.find(s, token)
+
+            def note(idx, s, val, best, kind):
+                nonlocal n_exact, n_tmpl
+                if kind == "modelo":
+                    n_tmpl += 1
+                elif best is None:
+                    n_exact += 1
+                else:
+                    sim = look.similarity(s, best)
+                    issues_fuzzy.append(
+                        f'L{idx}: [FUZZY {sim*100:.0f}%] "{s}" → "{best}"')
+
+            if byte_enc is not None:
+                bmap    = mapping.encoded(byte_enc)
+                sep     = os.linesep.encode(byte_enc)
+                ign_b   = ignore.for_bytes(byte_enc, force_enc_c is not None)
+                try:
+                    for idx, line in enumerate(lines_c, 1):
+                        stats.current_line = idx
+                        b = line.rstrip(b"\r\n")
+                        if not b:
+                            output.append(sep); continue
+                        if ignore:
+                            t0  = pc()
+                            ign = ign_b(line)
+                            t_ign += pc() - t0
+                            if ign:
+                                output.append(b + sep); continue
+                        val = bmap.get(b)
+                        if val is not None:
+                            output.append(val); n_exact += 1; continue
+                        s = b.decode(byte_enc)
+                        val, best, kind = find(s)
+                        if val is None:
+                            output.append(b + sep)
+                            issues_fail.append(f'L{idx}: [FALHA] "{s}"')
+                        else:
+                            output.append(val.replace("\n", os.linesep).encode(byte_enc))
+                            note(idx, s, val, best, kind)
+                except UnicodeEncodeError:
+                    # Tradução fora da codificação de saída: refaz o arquivo em texto
+                    output, issues_fail, issues_fuzzy = [], [], []
+                    n_exact  = n_tmpl = 0
+                    byte_enc = None
+                    lines_c  = read_lines(entry, out_enc, force_enc_c, log=log)
+            if byte_enc is None:
+                for idx, line in enumerate(lines_c, 1):
+                    stats.current_line = idx
+                    s = line.rstrip("\r\n")
+                    if not s:
+                        output.append(s + "\n"); continue
+                    if ignore:
+                        t0  = pc()
+                        ign = ignore(line)
+                        t_ign += pc() - t0
+                        if ign:
+                            output.append(s + "\n"); continue
+                    if extractor is None:
+                        val, best, kind = find(s)
+                        if val is None:
+                            output.append(s + "\n")
+                            issues_fail.append(f'L{idx}: [FALHA] "{s}"')
+                        else:
+                            output.append(val)
+                            note(idx, s, val, best, kind)
+                        continue
+                    # Formato: traduz só os trechos e encaixa de volta na linha
+                    parts, pos = [], 0
+                    for a, b in extractor(s):
+                        text = s[a:b]
+                        val, best, kind = find(text)
+                        parts.append(s[pos:a])
+                        if val is None:
+                            parts.append(text)
+                            issues_fail.append(f'L{idx}: [FALHA] "{text}"')
+                        else:
+                            parts.append(val.rstrip("\r\n"))
+                            note(idx, text, val, best, kind)
+                        pos = b
+                    parts.append(s[pos:])
+                    output.append("".join(parts) + "\n")
+            t_fuzzy += look.t_fuzzy
+        elif mode == "phrases":
+            matcher = mapping.phrases()
+            for idx, line in enumerate(lines_c, 1):
+                stats.current_line = idx
+                s = line.rstrip("\r\n")
+                if not s:
+                    output.append(s + "\n"); continue
+                if ignore:
+                    t0  = pc()
+                    ign = ignore(line)
+                    t_ign += pc() - t0
+                    if ign:
+                        output.append(s + "\n"); continue
+                if extractor is None:
+                    s, k = matcher.replace(s)
+                else:
+                    parts, pos, k = [], 0, 0
+                    for a, b in extractor(s):
+                        text, n = matcher.replace(s[a:b])
+                        parts.append(s[pos:a]); parts.append(text)
+                        k  += n
+                        pos = b
+                    parts.append(s[pos:])
+                    s = "".join(parts)
+                output.append(s + "\n")
+                if k:
+                    n_sub += k
+                    n_exact += 1
+            if n_sub:
+                stats.count("frases", n_sub)
+        elif isinstance(mapping, dict):
+            mapping = [{"orig": k, "trans": v} for k, v in mapping.items()]
+        if mode == "positional" and realign:
+            # Alinha C contra A uma vez; similaridade só nas lacunas
+            t0 = pc()
+            pair     = [False] * len(lines_c)   # False = linha ignorada
+            c_keys, c_pos = [], []
+            for k, line in enumerate(lines_c):
+                if ignore and ignore(line):
+                    continue
+                c_keys.append(line.strip())
+                c_pos.append(k)
+            a_keys = [item["orig"].strip() if item["orig"] else ""
+                      for item in mapping]
+            for k, j in zip(c_pos, align_sequences(c_keys, a_keys)):
+                pair[k] = j
+            t_align = pc() - t0
+            stats.add("align", t_align)
+
+            for idx, line in enumerate(lines_c, 1):
+                stats.current_line = idx
+                s = line.rstrip("\r\n")
+                j = pair[idx - 1]
+                if not s or j is False:
+                    output.append(s + "\n"); continue
+                if j is None:
+                    output.append(s + "\n")
+                    issues_fail.append(f"L{idx}: [FORA DE ÍNDICE]")
+                    continue
+                if j != idx - 1:
+                    stats.count("realinhadas")
+                item   = mapping[j]
+                orig_s = item["orig"].strip() if item["orig"] else ""
+                t      = item["trans"]
+                if not validate:
+                    output.append(t + "\n" if t and not t.endswith("\n")
+                                  else (t or s + "\n"))
+                    n_exact += 1
+                    continue
+                t0  = pc()
+                sim, tier = tiered_similarity(s, orig_s, threshold)
+                t_fuzzy += pc() - t0
+                tiers[tier] += 1
+                if sim >= threshold:
+                    output.append(t + "\n" if t and not t.endswith("\n")
+                                  else (t or s + "\n"))
+                    if sim < 1.0:
+                        issues_fuzzy.append(
+                            f'L{idx}: [FUZZY POSICIONAL {sim*100:.0f}%]')
+                    else:
+                        n_exact += 1
+                else:
+                    output.append(s + "\n")
+                    issues_fail.append(positional_failure(idx, sim, tier))
+        elif mode == "positional":
+            for idx, line in enumerate(lines_c, 1):
+                stats.current_line = idx
+                s = line.rstrip("\r\n")
+                if not s:
+                    output.append(s + "\n"); continue
+                if ignore:
+                    t0  = pc()
+                    ign = ignore(line)
+                    t_ign += pc() - t0
+                    if ign:
+                        output.append(s + "\n"); continue
+                map_idx = idx - 1
+                if map_idx < len(mapping):
+                    item   = mapping[map_idx]
+                    orig_s = item["orig"].strip() if item["orig"] else ""
+                    if not validate:
+                        t = item["trans"]
+                        output.append(t + "\n" if t and not t.endswith("\n")
+                                      else (t or s + "\n"))
+                        n_exact += 1
+                    else:
+                        t0  = pc()
+                        sim, tier = tiered_similarity(s, orig_s, threshold)
+                        t_fuzzy += pc() - t0
+                        tiers[tier] += 1
+                        if sim >= threshold:
+                            t = item["trans"]
+                            output.append(t + "\n" if t and not t.endswith("\n")
+                                          else (t or s + "\n"))
+                            if sim < 1.0:
+                                issues_fuzzy.append(
+                                    f'L{idx}: [FUZZY POSICIONAL {sim*100:.0f}%]')
+                            else:
+                                n_exact += 1
+                        else:
+                            output.append(s + "\n")
+                            issues_fail.append(positional_failure(idx, sim, tier))
+                else:
+                    output.append(s + "\n")
+                    issues_fail.append(f"L{idx}: [FORA DE ÍNDICE]")
+
+    if token.cancelled:
+        return None
+
+    stats.add("ignore", t_ign)
+    stats.add("fuzzy",  t_fuzzy)
+    stats.add("lookup", pc() - t_loop - t_ign - t_fuzzy - t_align)
+    stats.count("linhas",  len(lines_c))
+    stats.count("exatas",  n_exact)
+    stats.count("modelos", n_tmpl)
+    stats.count("fuzzy",   len(issues_fuzzy))
+    stats.count("falhas",  len(issues_fail))
+    for tier, n in tiers.items():
+        if n:
+            stats.count(f"camada_{tier}", n)
+    return output, byte_enc, issues_fail, issues_fuzzy, n_sub
+
+
+def _prefetch(entry, index, mapset, options, token, log):
+    """Estágio de leitura: dicionário e load_source fora da thread de tradução.
+
+    Num build sob demanda o par A/B do arquivo também é lido aqui. Devolve
+    (carregado, RunStats com as fases da leitura), ou None se a execução
+    foi cancelada antes de o arquivo ser lido.
+    """
+    if token.cancelled:
+        return None
+    part    = RunStats(entry.rel)
+    mapping = mapset.dictionary_for(entry.rel, index, part)
+    return load_source(entry, mapping, options, part, log), part
+
+
+def _write_output(sink, rel, data, src_rel=None, after=None):
+    """Estágio de gravação: (segundos, erro ou None).
+
+    `src_rel` grava `rel` como cópia do arquivo idêntico já traduzido; a
+    gravação dele (`after`) termina antes do link.
+    """
+    if after is not None:
+        from concurrent import futures
+        futures.wait([after])
+    t0 = time.perf_counter()
+    try:
+        if src_rel is None:
+            sink.write(rel, data)
+        else:
+            sink.link(rel, src_rel, data)
+    except Exception as e:
+        return time.perf_counter() - t0, e
+    return time.perf_counter() - t0, None
+
+
+def _finished(value):
+    """Future já concluído (etapas que não passaram pelo estágio de gravação)."""
+    from concurrent import futures
+    fut = futures.Future()
+    fut.set_result(value)
+    return fut
+
+
+def apply(files, mapset, options, sink=None, only=None, done=None, progress=None,
+          token=None, stats=None, log=None, memprof=None, cache=None,
+          read_ahead=APPLY_READ_AHEAD, writers=APPLY_WRITERS):
+    """Gerador: traduz os arquivos de C e produz um FileResult por arquivo, na ordem.
+
+    `files` é uma pasta/pacote ou a lista de scan_targets; `only(entry)`
+    restringe os arquivos (Brute Force continua usando a posição na lista
+    completa). Com `sink` (DirSink/ZipSink) cada saída é gravada; sem ele,
+    os bytes vêm em FileResult.data. `done` (rel → {"ok", "issues"}) pula
+    arquivos já concluídos que existem no destino. `progress(feitos, total,
+    rel)` é chamado no início e após cada arquivo.
+
+    Arquivos de C com o mesmo conteúdo, o mesmo dicionário e o mesmo
+    extrator são traduzidos uma vez; as cópias seguintes reaproveitam a
+    saída e os problemas (sink.link: hard link ou cópia). Com `cache`
+    (DecisionCache) as decisões do fuzzy são gravadas a cada arquivo.
+
+    A tradução roda nesta thread entre dois estágios: até `read_ahead`
+    arquivos são lidos e decodificados à frente, e `writers` threads gravam
+    as saídas por trás (no máximo 2 × writers na fila). Os resultados saem
+    na ordem dos arquivos quando a gravação termina; 0 desliga o estágio.
+    """
+    from concurrent import futures
+    mapset = mapset.using(options)
+    stats  = stats if stats is not None else RunStats("Aplicação")
+    token  = token or CancelToken()
+    log    = log or _no_log
+    pc     = time.perf_counter
+    if isinstance(files, (str, os.PathLike)):
+        with stats.timer("scan"):
+            files = scan_targets(files, options, log)
+    selected = [(i, e) for i, e in enumerate(files) if only is None or only(e)]
+    total    = len(selected)
+    stats.total_files = total
+    stats.total_bytes = sum(e.size for _, e in selected)
+    if progress: progress(0, total, None)
+
+    def index_of(i):
+        return i if options.brute_force else None
+
+    def resumed(rel):
+        return done is not None and rel in done and sink is not None and sink.exists(rel)
+
+    # Conteúdo repetido: chave (hash, dicionário, extrator) → primeira saída
+    digests = content_digests([e for _, e in selected if not (done and e.rel in done)], stats)
+    dup_key = {}
+    for i, e in selected:
+        if e.rel in digests:
+            ident = mapset.entry_for(e.rel, index_of(i))    # identidade, sem ler o par
+            dup_key[e.rel] = (digests[e.rel], id(ident),
+                              extractor_for(options.extract_fmt, e.rel))
+    pending = Counter(dup_key.values())
+    dup_key = {rel: k for rel, k in dup_key.items() if pending[k] > 1}
+    first   = {}     # chave → (rel, bytes, problemas, frases, gravação)
+
+    # Leitura antecipada: só arquivos que serão traduzidos (não cópias nem retomados)
+    to_read, seen = deque(), set()
+    for n, (i, e) in enumerate(selected):
+        key = dup_key.get(e.rel)
+        if key in seen or resumed(e.rel):
+            continue
+        if key is not None:
+            seen.add(key)
+        to_read.append(n)
+    if sink is not None and not sink.parallel:
+        writers = min(writers, 1)
+    readers = futures.ThreadPoolExecutor(read_ahead) if read_ahead > 0 else None
+    writing = futures.ThreadPoolExecutor(writers) if writers > 0 else None
+    ahead   = {}        # posição → leitura em andamento
+    out     = deque()   # [posição, FileResult, gravação ou None, bytes, cópia?] na ordem
+
+    def write(rel, data, src_rel=None, after=None):
+        if sink is None:
+            return _finished((0.0, None))
+        if writing is None:
+            return _finished(_write_output(sink, rel, data, src_rel, after))
+        return writing.submit(_write_output, sink, rel, data, src_rel, after)
+
+    def drain(limit):
+        """Entrega, em ordem, os resultados cuja gravação terminou (ou até sobrar `limit`)."""
+        while out and (len(out) > limit or out[0][2] is None or out[0][2].done()):
+            n, res, fut, data, dup = out.popleft()
+            if fut is not None:
+                sec, err = fut.result()
+                stats.add("write", sec, res.rel)
+                if err is None:
+                    res.ok = True
+                    stats.count("bytes_escritos", len(data))
+                else:
+                    where = Path(sink.location) / res.rel if sink is not None else res.rel
+                    log(f"Erro ao salvar {where}: {err}", "ERROR")
+                if dup:
+                    stats.count("duplicados")
+                stats.count("arquivos")
+            yield res
+            if progress: progress(n + 1, total, res.rel)
+
+    try:
+        for n, (i, entry) in enumerate(selected):
+            if token.cancelled:
+                break
+            while readers is not None and to_read and len(ahead) < read_ahead:
+                m = to_read.popleft()
+                if m < n:
+                    continue
+                mi, me = selected[m]
+                ahead[m] = readers.submit(_prefetch, me, index_of(mi), mapset, options,
+                                          token, log)
+            rel = entry.rel
+            key = dup_key.get(rel)
+            if key is not None:
+                pending[key] -= 1
+
+            # Já concluído numa execução anterior (checkpoint)?
+            if resumed(rel):
+                prev = done[rel]
+                stats.done_bytes += entry.size
+                out.append([n, FileResult(rel, prev["ok"], prev["issues"], resumed=True),
+                            None, None, False])
+                yield from drain(2 * writers)
+                continue
+
+            stats.begin_file(rel, entry.size)
+            src = first.get(key) if key is not None else None
+            if src is not None:
+                src_rel, data, issues, n_sub, src_write = src
+                if not pending[key]:
+                    del first[key]
+                res = FileResult(rel, False, issues, n_sub, same_as=src_rel,
+                                 data=data if sink is None else None)
+                fut = write(rel, data, src_rel, src_write)
+                stats.end_file()
+                out.append([n, res, fut, data, True])
+                yield from drain(2 * writers)
+                continue
+
+            loaded = None
+            prefetched = ahead.pop(n, None)
+            if prefetched is not None:
+                loaded = prefetched.result()
+                if loaded is None:          # cancelado antes da leitura
+                    stats.end_file()
+                    break
+                loaded, part = loaded
+                stats.merge(part)
+            res = translate_file(entry, i, mapset, stats, token, log, memprof, cache,
+                                 loaded)
+            if res is None:
+                # Arquivo interrompido no meio: não grava nem entra no checkpoint
+                stats.end_file()
+                break
+            output, byte_enc, issues_fail, issues_fuzzy, n_sub = res
+            issues = issues_fail + issues_fuzzy
+
+            t0 = pc()
+            try:
+                data = encode_output(output, byte_enc, options.encoding_out)
+            except Exception as e:
+                data = None
+                fut  = _finished((0.0, e))
+            else:
+                fut = write(rel, data)
+            stats.add("write", pc() - t0)
+            stats.end_file()
+
+            if cache is not None:
+                import sqlite3
+                try:
+                    cache.flush()
+                except sqlite3.Error as e:
+                    log(f"Cache de decisões desativado: {e}", "WARN")
+                    cache = None
+            if data is not None and key is not None and pending[key]:
+                first[key] = (rel, data, issues, n_sub, fut)
+            out.append([n, FileResult(rel, False, issues, n_sub,
+                                      data=data if sink is None else None),
+                        fut, data, False])
+            yield from drain(2 * writers)
+
+        # Gravações já enfileiradas terminam mesmo com cancelamento
+        yield from drain(0)
+    finally:
+        if readers is not None:
+            readers.shutdown(wait=True, cancel_futures=True)
+        if writing is not None:
+            writing.shutdown(wait=True)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  WIDGET: BOTÃO MODERNO (Canvas-based com hover animado)
 # ─────────────────────────────────────────────────────────────────────────────
 class ModernButton(tk.Canvas):
-    """Botão customizado com cantos arredondados e animação de hover."""
+    """Botão customizado com cantos arredondados e animação de hover.
+
+    Os itens do canvas (polígono e texto) são criados uma única vez; trocas
+    de estado (hover/pressionado/desabilitado) só recolorem os itens com
+    ``itemconfigure``. As cores de cada estado ficam em cache por estilo e
+    tema, compartilhado entre todos os botões.
+    """
+
+    # (estilo, fundo do tema) → {estado: (bg, fg)}
+    _PALETTES = {}
 
     def __init__(self, parent, text, command=None, style="primary",
                  width=180, height=34, font_size=9, icon="", **kwargs):
@@ -101,6 +3689,15 @@ class ModernButton(tk.Canvas):
         self._target_color  = None
         self._disabled      = False
         self._drawing       = False
+        self._state         = None
+        self._palette       = None
+        self._theme_key     = None
+
+        w, h, r = width, height, 8
+        self._shape = self._rounded_rect(2, 2, w-2, h-2, r, outline="")
+        self._label = self.create_text(w//2, h//2, text=self._label_text(),
+                                       font=("Segoe UI", font_size, "bold"),
+                                       anchor="center")
 
         self.bind("<Enter>",         self._on_enter)
         self.bind("<Leave>",         self._on_leave)
@@ -109,8 +3706,12 @@ class ModernButton(tk.Canvas):
 
         self._draw(None)
 
-    def _get_colors(self, hover=False, pressed=False):
-        C = self.master.winfo_toplevel()._C if hasattr(self.master.winfo_toplevel(), '_C') else DARK
+    def _theme(self):
+        top = self.master.winfo_toplevel()
+        return top._C if hasattr(top, '_C') else DARK
+
+    def _get_colors(self, hover=False, pressed=False, C=None):
+        C = C or self._theme()
         if self._disabled:
             return C["border"], C["text_dim"]
         if self.style == "primary":
@@ -124,20 +3725,50 @@ class ModernButton(tk.Canvas):
         fg = C["text"]
         return bg, fg
 
-    def _draw(self, event, hover=False, pressed=False):
+    def _load_palette(self):
+        """Resolve (uma vez por estilo e tema) as cores de cada estado."""
+        C = self._theme()
+        key = (self.style, C["bg"])
+        palette = self._PALETTES.get(key)
+        if palette is None:
+            disabled, self._disabled = self._disabled, False
+            palette = {
+                "normal":  self._get_colors(False, False, C),
+                "hover":   self._get_colors(True, False, C),
+                "pressed": self._get_colors(False, True, C),
+                "disabled": (C["border"], C["text_dim"]),
+            }
+            self._disabled = disabled
+            self._PALETTES[key] = palette
+        self._palette = palette
+        self._theme_key = C["bg"]
         self._drawing = True
         try:
-            self.delete("all")
-            C = self.master.winfo_toplevel()._C if hasattr(self.master.winfo_toplevel(), '_C') else DARK
-            self.configure(bg=C["bg"])
-            bg, fg = self._get_colors(hover, pressed)
-            w, h, r = self._width, self._height, 8
-            self._rounded_rect(2, 2, w-2, h-2, r, fill=bg, outline="")
-            label = (self._icon + "  " + self._text) if self._icon else self._text
-            self.create_text(w//2, h//2, text=label, fill=fg,
-                             font=("Segoe UI", self._fs, "bold"), anchor="center")
+            super().configure(bg=C["bg"])
         finally:
             self._drawing = False
+        self._state = None
+
+    def _label_text(self):
+        return (self._icon + "  " + self._text) if self._icon else self._text
+
+    def _draw(self, event, hover=False, pressed=False):
+        if self._palette is None:
+            self._load_palette()
+        if self._disabled:
+            state = "disabled"
+        elif pressed:
+            state = "pressed"
+        elif hover:
+            state = "hover"
+        else:
+            state = "normal"
+        if state == self._state:
+            return
+        self._state = state
+        bg, fg = self._palette[state]
+        self.itemconfigure(self._shape, fill=bg)
+        self.itemconfigure(self._label, fill=fg)
 
     def _rounded_rect(self, x1, y1, x2, y2, r, **kw):
         pts = [
@@ -148,7 +3779,7 @@ class ModernButton(tk.Canvas):
             x1, y2,     x1, y2-r,
             x1, y1+r,   x1, y1,
         ]
-        self.create_polygon(pts, smooth=True, **kw)
+        return self.create_polygon(pts, smooth=True, **kw)
 
     def _on_enter(self, e):
         if not self._disabled:
@@ -173,16 +3804,23 @@ class ModernButton(tk.Canvas):
         self._draw(None)
 
     def refresh(self):
+        """Reaplica o tema atual; sem custo se o tema não mudou."""
+        if self._theme_key != self._theme()["bg"]:
+            self._load_palette()
         self._draw(None)
 
     def configure(self, **kwargs):
+        relabel = False
         if "text" in kwargs:
             self._text = kwargs.pop("text")
+            relabel = True
         if "icon" in kwargs:
             self._icon = kwargs.pop("icon")
-        super().configure(**kwargs)
-        if not getattr(self, "_drawing", False):
-            self._draw(None)
+            relabel = True
+        if relabel:
+            self.itemconfigure(self._label, text=self._label_text())
+        if kwargs:
+            super().configure(**kwargs)
 
     def config(self, **kwargs):
         self.configure(**kwargs)
@@ -249,6 +3887,13 @@ class Card(tk.Frame):
 #  WIDGET: BARRA DE PROGRESSO CUSTOMIZADA
 # ─────────────────────────────────────────────────────────────────────────────
 class ModernProgressBar(tk.Canvas):
+    """Barra de progresso arredondada.
+
+    Trilho e preenchimento são itens fixos do canvas: uma atualização de
+    valor só move coordenadas, e nada é feito se a largura em pixels do
+    preenchimento não mudou.
+    """
+
     def __init__(self, parent, height=6, **kwargs):
         C = parent.winfo_toplevel()._C if hasattr(parent.winfo_toplevel(), '_C') else DARK
         super().__init__(parent, height=height, highlightthickness=0, bd=0,
@@ -256,6 +3901,12 @@ class ModernProgressBar(tk.Canvas):
         self._max = 100
         self._val = 0
         self._h   = height
+        self._geom = None
+        self._track = self.create_polygon(0, 0, 0, 0, smooth=True, outline="")
+        self._fill  = self.create_polygon(0, 0, 0, 0, smooth=True, outline="")
+        self._dot   = self.create_oval(0, 0, height, height, outline="",
+                                       state="hidden")
+        self._recolor(C)
         self.bind("<Configure>", self._redraw)
 
     def config(self, **kw):
@@ -267,25 +3918,37 @@ class ModernProgressBar(tk.Canvas):
             super().config(**kw)
         self._redraw(None)
 
+    def _recolor(self, C):
+        self.configure(bg=C["bg"])
+        self.itemconfigure(self._track, fill=C["progress_bg"])
+        self.itemconfigure(self._fill,  fill=C["progress_fg"])
+        self.itemconfigure(self._dot,   fill=C["progress_fg"])
+
     def _redraw(self, event):
-        self.delete("all")
-        C = self.winfo_toplevel()._C if hasattr(self.winfo_toplevel(), '_C') else DARK
-        self.configure(bg=C["bg"])
         w = self.winfo_width() or 400
         h = self._h
         r = h // 2
-        # Track
-        self._rounded_rect(0, 0, w, h, r, fill=C["progress_bg"])
-        # Fill
         ratio = (self._val / self._max) if self._max else 0
         fw = int(w * ratio)
+        if (w, fw) == self._geom:
+            return
+        if self._geom is None or self._geom[0] != w:
+            self.coords(self._track, *self._rounded_pts(0, 0, w, h, r))
+        self._geom = (w, fw)
         if fw > r * 2:
-            self._rounded_rect(0, 0, fw, h, r, fill=C["progress_fg"])
+            self.coords(self._fill, *self._rounded_pts(0, 0, fw, h, r))
+            self.itemconfigure(self._fill, state="normal")
+            self.itemconfigure(self._dot, state="hidden")
         elif fw > 0:
-            self.create_oval(0, 0, h, h, fill=C["progress_fg"], outline="")
+            self.itemconfigure(self._fill, state="hidden")
+            self.itemconfigure(self._dot, state="normal")
+        else:
+            self.itemconfigure(self._fill, state="hidden")
+            self.itemconfigure(self._dot, state="hidden")
 
-    def _rounded_rect(self, x1, y1, x2, y2, r, **kw):
-        pts = [
+    @staticmethod
+    def _rounded_pts(x1, y1, x2, y2, r):
+        return [
             x1+r, y1,   x2-r, y1,
             x2, y1,     x2, y1+r,
             x2, y2-r,   x2, y2,
@@ -293,9 +3956,10 @@ class ModernProgressBar(tk.Canvas):
             x1, y2,     x1, y2-r,
             x1, y1+r,   x1, y1,
         ]
-        self.create_polygon(pts, smooth=True, **kw)
 
     def refresh(self):
+        C = self.winfo_toplevel()._C if hasattr(self.winfo_toplevel(), '_C') else DARK
+        self._recolor(C)
         self._redraw(None)
 
 
@@ -322,22 +3986,51 @@ class TextMapperApp(tk.Tk):
         self.encoding_ab       = tk.StringVar(value="utf-8")
         self.encoding_c_out    = tk.StringVar(value="utf-8")
         self.force_encoding_c  = tk.BooleanVar(value=False)
+        self.byte_path         = tk.BooleanVar(value=False)
+        self.archive_output    = tk.BooleanVar(value=False)
 
         self.dark_mode             = tk.BooleanVar(value=True)
         self.recursive_search      = tk.BooleanVar(value=True)
         self.file_extension        = tk.StringVar(value=".txt")
+        self.include_globs         = tk.StringVar(value="")
+        self.exclude_globs         = tk.StringVar(value="")
+        self.text_format           = tk.StringVar(value="Linhas")
         self.match_by_filename_only= tk.BooleanVar(value=False)
         self.brute_force_by_order  = tk.BooleanVar(value=False)
         self.unified_dict          = tk.BooleanVar(value=False)
         self.ignore_prefixes       = tk.StringVar(value="")
+        self.ignore_regex          = tk.StringVar(value="")
+        self.norm_whitespace       = tk.BooleanVar(value=False)
+        self.norm_unicode          = tk.BooleanVar(value=False)
+        self.norm_casefold         = tk.BooleanVar(value=False)
+        self.template_match        = tk.BooleanVar(value=True)
         self.mapping_mode          = tk.StringVar(value="content")
         self.validate_positional   = tk.BooleanVar(value=True)
+        self.realign_positional    = tk.BooleanVar(value=False)
         self.fuzzy_threshold       = tk.DoubleVar(value=100.0)
-
-        self.mappings         = {}
-        self.mappings_by_name = {}
-        self.mappings_list    = []
-        self.global_mapping   = {}   # Dicionário único mesclado de todos os pares A/B
+        self.decision_cache        = tk.BooleanVar(value=True)
+        self.lazy_build            = tk.BooleanVar(value=True)
+        self.profile_run           = tk.BooleanVar(value=False)
+        self.memory_profile        = tk.BooleanVar(value=False)
+        self.watch_mode            = tk.BooleanVar(value=False)
+        self.server_mode           = tk.BooleanVar(value=False)
+        self.server_port           = tk.StringVar(value=str(SERVER_PORT))
+        self.read_ahead            = tk.StringVar(value=str(APPLY_READ_AHEAD))
+        self.write_threads         = tk.StringVar(value=str(APPLY_WRITERS))
+
+        self._adopt_mapset(MappingSet())   # Dicionários A/B (ver build)
+        self._last_build_memory = []  # Resumo de memória da última construção
+
+        # Modo observação: observador, lote pendente e relatório acumulado
+        self._watcher       = None
+        self._watch_pending = {"a": set(), "b": set(), "c": set()}
+        self._watch_changed_ab = set()
+        self._watch_changed_c  = set()
+        self._watch_issues  = {}
+        self._watch_phrases = {}
+
+        # Servidor local de tradução (None = desligado)
+        self._server = None
 
         # Status counters
         self._status_mapped    = 0
@@ -350,18 +4043,34 @@ class TextMapperApp(tk.Tk):
         self._progress_bars    = []
         self._cards            = []
 
+        # Execuções em andamento: token de cancelamento → (tipo, thread)
+        self._workers = {}
+        self._closing = False
+
+        # Troca de tema agendada (coalescida por ciclo ocioso)
+        self._theme_pending = None
+        self._theme_applied = None
+
+        STARTUP.mark("app: estados")
         self._build_ui()
+        STARTUP.mark("app: interface principal")
         self._apply_theme()
         self._update_mode_options()
+        STARTUP.mark("app: tema")
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        # Painéis secundários depois que a janela já está na tela
+        self.after_idle(self._build_deferred)
 
     # ── Tema ─────────────────────────────────────────────────────────────────
     def _apply_theme(self):
         C = self._C
+        self._theme_applied = self._dark_mode
         self.configure(bg=C["bg"])
 
         # TTK styles
         style = ttk.Style(self)
-        style.theme_use("clam")
+        if style.theme_use() != "clam":
+            style.theme_use("clam")
 
         style.configure(".", background=C["bg"], foreground=C["text"],
                         font=("Segoe UI", 9))
@@ -442,7 +4151,6 @@ class TextMapperApp(tk.Tk):
         # Refresh custom widgets
         for btn in self._modern_buttons:
             try:
-                btn.configure(bg=C["bg"])
                 btn.refresh()
             except tk.TclError:
                 pass
@@ -477,6 +4185,13 @@ class TextMapperApp(tk.Tk):
                 activestyle="none")
         except: pass
 
+        # Painel de métricas
+        try:
+            self.metrics_frame.configure(bg=C["bg"])
+            for lbl in self.metrics_labels.values():
+                lbl.configure(bg=C["bg"], fg=C["text_dim"])
+        except: pass
+
         # Status bar
         try:
             self.status_bar.configure(bg=C["surface2"])
@@ -511,12 +4226,25 @@ class TextMapperApp(tk.Tk):
                 pass
 
     def _toggle_theme(self):
+        """Alterna o tema; cliques seguidos são aplicados num único lote.
+
+        A troca em si (estilos ttk, widgets tk, canvases) roda uma vez no
+        próximo ciclo ocioso do loop de eventos, com o tema que estiver
+        valendo nesse momento, e não a cada clique.
+        """
         self._dark_mode = not self._dark_mode
         self._C = DARK.copy() if self._dark_mode else LIGHT.copy()
         self.dark_mode.set(self._dark_mode)
         text = "Modo Claro" if self._dark_mode else "Modo Escuro"
         icon = "☀" if self._dark_mode else "🌙"
         self.theme_btn.configure(text=text, icon=icon)
+        if self._theme_pending is None:
+            self._theme_pending = self.after_idle(self._flush_theme)
+
+    def _flush_theme(self):
+        self._theme_pending = None
+        if self._theme_applied is self._dark_mode:
+            return
         self._apply_theme()
 
     def _apply_treeview_stripes(self):
@@ -658,6 +4386,30 @@ class TextMapperApp(tk.Tk):
                                                style="secondary", width=90, height=28, icon="🔍")
             browse_btn.grid(row=i, column=2, pady=4)
 
+            archive_btn = self._make_modern_btn(fbody, "Pacote",
+                                                command=lambda v=var: self._select_archive(v),
+                                                style="secondary", width=90, height=28, icon="🗜")
+            archive_btn.grid(row=i, column=3, pady=4, padx=(6, 0))
+
+        # Filtros de varredura (globs sobre o caminho relativo)
+        flt_lbl = tk.Frame(fbody, bg=C["surface"])
+        flt_lbl.grid(row=len(folder_defs), column=0, sticky="w", pady=4, padx=(0, 12))
+        tk.Label(flt_lbl, text="🔎", bg=C["surface"], fg=C["text"],
+                 font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        tk.Label(flt_lbl, text="Filtros", bg=C["surface"], fg=C["text"],
+                 font=("Segoe UI", 9, "bold")).pack(side="left")
+        flt_row = tk.Frame(fbody, bg=C["surface"])
+        flt_row.grid(row=len(folder_defs), column=1, columnspan=3, sticky="w", pady=4)
+        for text, var in (("Incluir", self.include_globs), ("Excluir", self.exclude_globs)):
+            tk.Label(flt_row, text=text, bg=C["surface"], fg=C["text_dim"],
+                     font=("Segoe UI", 8)).pack(side="left", padx=(0, 3))
+            tk.Entry(flt_row, textvariable=var, width=24,
+                     bg=C["surface2"], fg=C["text"], insertbackground=C["text"],
+                     relief="flat", bd=4, font=("Segoe UI", 9)).pack(side="left", padx=(0, 12))
+        tk.Label(flt_row, text="ex: dialog/*  *_old.txt  (extensões: .txt .lua)",
+                 bg=C["surface"], fg=C["text_dim"],
+                 font=("Segoe UI", 8)).pack(side="left")
+
         # ── Barra de Configuração + Ações ────────────────────────────────────
         cfg_bar = tk.Frame(main, bg=C["surface"])
         cfg_bar.pack(fill="x", pady=(0, 10))
@@ -684,13 +4436,22 @@ class TextMapperApp(tk.Tk):
                      state="readonly").pack(side="left", padx=(0, 6))
 
         ttk.Checkbutton(enc_grp, text="Forçar em C",
-                         variable=self.force_encoding_c).pack(side="left", padx=(0, 16))
+                         variable=self.force_encoding_c).pack(side="left", padx=(0, 8))
+        ttk.Checkbutton(enc_grp, text="Bytes diretos",
+                         variable=self.byte_path).pack(side="left", padx=(0, 8))
+        ttk.Checkbutton(enc_grp, text="Saída .zip",
+                         variable=self.archive_output).pack(side="left", padx=(0, 16))
 
         _lbl("Extensão", parent=enc_grp)
-        ext_entry = tk.Entry(enc_grp, textvariable=self.file_extension, width=7,
+        ext_entry = tk.Entry(enc_grp, textvariable=self.file_extension, width=12,
                               bg=C["surface2"], fg=C["text"], insertbackground=C["text"],
                               relief="flat", bd=4, font=("Segoe UI", 9))
-        ext_entry.pack(side="left", padx=(0, 16))
+        ext_entry.pack(side="left", padx=(0, 10))
+
+        _lbl("Formato", parent=enc_grp)
+        ttk.Combobox(enc_grp, textvariable=self.text_format,
+                     values=list(FORMAT_LABELS), width=10,
+                     state="readonly").pack(side="left", padx=(0, 16))
 
         ttk.Checkbutton(enc_grp, text="Brute Force (Ordem)",
                          variable=self.brute_force_by_order,
@@ -718,7 +4479,14 @@ class TextMapperApp(tk.Tk):
             command=self.apply_report,
             style="accent2", width=190, height=34, icon="📋")
         self.btn_report.config_state("disabled")
-        self.btn_report.pack(side="left")
+        self.btn_report.pack(side="left", padx=(0, 8))
+
+        self.btn_cancel = self._make_modern_btn(
+            btn_grp, "Cancelar",
+            command=self._cancel_run,
+            style="secondary", width=110, height=34, icon="■")
+        self.btn_cancel.config_state("disabled")
+        self.btn_cancel.pack(side="left")
 
         # ── Opções de Processamento ──────────────────────────────────────────
         opts_card = tk.Frame(main, bg=C["surface"])
@@ -744,6 +4512,32 @@ class TextMapperApp(tk.Tk):
             col1, text="Apenas Nome (Ignorar Estrutura)",
             variable=self.match_by_filename_only)
         self.match_by_filename_only_check.pack(anchor="w", pady=2)
+        ttk.Checkbutton(col1, text="Perfil de desempenho (cProfile)",
+                         variable=self.profile_run).pack(anchor="w", pady=2)
+        ttk.Checkbutton(col1, text="Contabilidade de memória (tracemalloc)",
+                         variable=self.memory_profile).pack(anchor="w", pady=2)
+        ttk.Checkbutton(col1, text="Carregar dicionários sob demanda",
+                         variable=self.lazy_build).pack(anchor="w", pady=2)
+        ttk.Checkbutton(col1, text="Observar pastas (reaplicar ao mudar)",
+                         variable=self.watch_mode,
+                         command=self._toggle_watch).pack(anchor="w", pady=2)
+        server_row = tk.Frame(col1, bg=C["surface"])
+        server_row.pack(anchor="w", pady=2)
+        ttk.Checkbutton(server_row, text=f"Servidor local ({SERVER_HOST}) porta",
+                         variable=self.server_mode,
+                         command=self._toggle_server).pack(side="left")
+        tk.Entry(server_row, textvariable=self.server_port, width=6,
+                 bg=C["surface2"], fg=C["text"], insertbackground=C["text"],
+                 relief="flat", bd=2, font=("Segoe UI", 9)).pack(side="left", padx=(4, 0))
+        pipe_row = tk.Frame(col1, bg=C["surface"])
+        pipe_row.pack(anchor="w", pady=2)
+        for label, var in (("Ler à frente", self.read_ahead),
+                           ("Gravadores", self.write_threads)):
+            tk.Label(pipe_row, text=label, bg=C["surface"], fg=C["text"],
+                     font=("Segoe UI", 9)).pack(side="left", padx=(0, 4))
+            tk.Entry(pipe_row, textvariable=var, width=3,
+                     bg=C["surface2"], fg=C["text"], insertbackground=C["text"],
+                     relief="flat", bd=2, font=("Segoe UI", 9)).pack(side="left", padx=(0, 10))
 
         # ── Dicionário Único ─────────────────────────────────────────────────
         sep_frame = tk.Frame(col1, bg=C["border"], height=1)
@@ -782,12 +4576,19 @@ class TextMapperApp(tk.Tk):
                          variable=self.mapping_mode, value="content").pack(side="left")
         ttk.Radiobutton(rb_frame, text="Posicional",
                          variable=self.mapping_mode, value="positional").pack(side="left", padx=8)
+        ttk.Radiobutton(rb_frame, text="Frases",
+                         variable=self.mapping_mode, value="phrases").pack(side="left")
 
         self.validate_check = ttk.Checkbutton(col2,
             text="Validar similaridade na posição",
             variable=self.validate_positional)
         self.validate_check.pack(anchor="w", pady=2)
 
+        self.realign_check = ttk.Checkbutton(col2,
+            text="Realinhar linhas inseridas/removidas",
+            variable=self.realign_positional)
+        self.realign_check.pack(anchor="w", pady=2)
+
         # Coluna 3: ignorar prefixos
         col3 = tk.Frame(opts_body, bg=C["surface"])
         col3.pack(side="left", padx=(0, 24))
@@ -802,6 +4603,28 @@ class TextMapperApp(tk.Tk):
         pfx_entry.pack(side="left")
         tk.Label(pfx_row, text=" ex: ;  //", bg=C["surface"], fg=C["text_dim"],
                  font=("Segoe UI", 8)).pack(side="left", padx=4)
+        rx_row = tk.Frame(col3, bg=C["surface"])
+        rx_row.pack(anchor="w", pady=(0, 4))
+        rx_entry = tk.Entry(rx_row, textvariable=self.ignore_regex, width=16,
+                             bg=C["surface2"], fg=C["text"], insertbackground=C["text"],
+                             relief="flat", bd=4, font=("Segoe UI", 9))
+        rx_entry.pack(side="left")
+        tk.Label(rx_row, text=" regex (separe com espaço)", bg=C["surface"],
+                 fg=C["text_dim"], font=("Segoe UI", 8)).pack(side="left", padx=4)
+
+        tk.Label(col3, text="Normalizar chaves",
+                 bg=C["surface"], fg=C["text_dim"],
+                 font=("Segoe UI", 8, "bold")).pack(anchor="w")
+        norm_row = tk.Frame(col3, bg=C["surface"])
+        norm_row.pack(anchor="w")
+        ttk.Checkbutton(norm_row, text="Espaços",
+                         variable=self.norm_whitespace).pack(side="left")
+        ttk.Checkbutton(norm_row, text="Unicode (NFC)",
+                         variable=self.norm_unicode).pack(side="left", padx=6)
+        ttk.Checkbutton(norm_row, text="Maiúsc./minúsc.",
+                         variable=self.norm_casefold).pack(side="left")
+        ttk.Checkbutton(col3, text="Modelos com variáveis ({0}, %d, <tag>, nº)",
+                         variable=self.template_match).pack(anchor="w", pady=(2, 0))
 
         # Coluna 4 (direita): fuzzy slider
         col4 = tk.Frame(opts_body, bg=C["surface"])
@@ -822,73 +4645,15 @@ class TextMapperApp(tk.Tk):
                                       variable=self.fuzzy_threshold, length=180,
                                       command=self._update_fuzzy_label)
         self.fuzzy_scale.pack(side="left")
+        ttk.Checkbutton(col4, text="Lembrar decisões entre execuções",
+                         variable=self.decision_cache).pack(anchor="w")
 
         self.mapping_mode.trace_add("write", self._update_mode_options)
 
-        # ── Painel central: lista + treeview ─────────────────────────────────
-        paned = ttk.PanedWindow(main, orient="horizontal")
-        paned.pack(fill="both", expand=True, pady=(0, 10))
-
-        # Lista de arquivos
-        list_outer = tk.Frame(paned, bg=C["surface"])
-        list_hdr = tk.Frame(list_outer, bg=C["surface"], padx=10, pady=6)
-        list_hdr.pack(fill="x")
-        tk.Label(list_hdr, text="📁  ARQUIVOS A/B MAPEADOS",
-                 bg=C["surface"], fg=C["accent"],
-                 font=("Segoe UI", 8, "bold")).pack(side="left")
-        tk.Frame(list_outer, bg=C["border"], height=1).pack(fill="x", padx=10)
-
-        list_inner = tk.Frame(list_outer, bg=C["surface"], padx=8, pady=8)
-        list_inner.pack(fill="both", expand=True)
-
-        listbox_scroll = ttk.Scrollbar(list_inner, orient="vertical")
-        self.files_listbox = tk.Listbox(
-            list_inner,
-            font=("Segoe UI", 9),
-            bg=C["surface"], fg=C["text"],
-            selectbackground=C["tree_sel"], selectforeground=C["text"],
-            relief="flat", bd=0, activestyle="none",
-            yscrollcommand=listbox_scroll.set,
-            highlightthickness=0)
-        listbox_scroll.config(command=self.files_listbox.yview)
-        listbox_scroll.pack(side="right", fill="y")
-        self.files_listbox.pack(fill="both", expand=True)
-        self.files_listbox.bind("<<ListboxSelect>>", self._on_file_select)
-        paned.add(list_outer, weight=1)
-
-        # Preview / Treeview
-        tree_outer = tk.Frame(paned, bg=C["surface"])
-        tree_hdr = tk.Frame(tree_outer, bg=C["surface"], padx=10, pady=6)
-        tree_hdr.pack(fill="x")
-        tk.Label(tree_hdr, text="📖  PREVIEW DO DICIONÁRIO",
-                 bg=C["surface"], fg=C["accent"],
-                 font=("Segoe UI", 8, "bold")).pack(side="left")
-        tk.Frame(tree_outer, bg=C["border"], height=1).pack(fill="x", padx=10)
-
-        tree_inner = tk.Frame(tree_outer, bg=C["surface"], padx=8, pady=8)
-        tree_inner.pack(fill="both", expand=True)
-
-        tree_scroll_y = ttk.Scrollbar(tree_inner, orient="vertical")
-        tree_scroll_x = ttk.Scrollbar(tree_inner, orient="horizontal")
-        self.tree = ttk.Treeview(tree_inner,
-                                  columns=("idx", "orig", "trans"),
-                                  show="headings",
-                                  yscrollcommand=tree_scroll_y.set,
-                                  xscrollcommand=tree_scroll_x.set)
-        for col, txt, w, anchor in [
-            ("idx",  "№",            50,  "center"),
-            ("orig", "Original (A)", 340, "w"),
-            ("trans","Tradução (B)", 340, "w"),
-        ]:
-            self.tree.heading(col, text=txt)
-            self.tree.column(col, width=w, anchor=anchor, minwidth=40)
-
-        tree_scroll_y.config(command=self.tree.yview)
-        tree_scroll_x.config(command=self.tree.xview)
-        tree_scroll_y.pack(side="right", fill="y")
-        tree_scroll_x.pack(side="bottom", fill="x")
-        self.tree.pack(fill="both", expand=True)
-        paned.add(tree_outer, weight=3)
+        # ── Painel central: lista + treeview (montado em _build_deferred) ────
+        self._center_slot = tk.Frame(main, bg=C["bg"])
+        self._center_slot.pack(fill="both", expand=True, pady=(0, 10))
+        self._deferred_built = False
 
         # ── Progress Bar ─────────────────────────────────────────────────────
         prog_row = tk.Frame(main, bg=C["bg"])
@@ -908,6 +4673,16 @@ class TextMapperApp(tk.Tk):
                                       font=("Segoe UI", 8, "bold"), width=5)
         self.progress_pct.pack(side="left", padx=(8, 0))
 
+        # ── Painel de métricas ao vivo ───────────────────────────────────────
+        self.metrics_frame = tk.Frame(main, bg=C["bg"])
+        self.metrics_frame.pack(fill="x", pady=(0, 6))
+        self.metrics_labels = {}
+        for key in ("rate", "hits", "current", "eta"):
+            lbl = tk.Label(self.metrics_frame, text="", bg=C["bg"], fg=C["text_dim"],
+                           font=("Consolas", 8), anchor="w")
+            lbl.pack(side="left", padx=(0, 18))
+            self.metrics_labels[key] = lbl
+
         # ── Console de Log ───────────────────────────────────────────────────
         log_outer = tk.Frame(main, bg=C["surface"])
         log_outer.pack(fill="x")
@@ -967,6 +4742,87 @@ class TextMapperApp(tk.Tk):
             font=("Segoe UI", 8))
         self.version_label.pack(side="right", padx=12)
 
+    def _build_deferred(self):
+        """Monta o painel central (lista A/B + preview); idempotente."""
+        if self._deferred_built:
+            return
+        self._deferred_built = True
+        C = self._C
+        paned = ttk.PanedWindow(self._center_slot, orient="horizontal")
+        paned.pack(fill="both", expand=True)
+
+        # Lista de arquivos
+        list_outer = tk.Frame(paned, bg=C["surface"])
+        list_hdr = tk.Frame(list_outer, bg=C["surface"], padx=10, pady=6)
+        list_hdr.pack(fill="x")
+        tk.Label(list_hdr, text="📁  ARQUIVOS A/B MAPEADOS",
+                 bg=C["surface"], fg=C["accent"],
+                 font=("Segoe UI", 8, "bold")).pack(side="left")
+        tk.Frame(list_outer, bg=C["border"], height=1).pack(fill="x", padx=10)
+
+        list_inner = tk.Frame(list_outer, bg=C["surface"], padx=8, pady=8)
+        list_inner.pack(fill="both", expand=True)
+
+        listbox_scroll = ttk.Scrollbar(list_inner, orient="vertical")
+        self.files_listbox = tk.Listbox(
+            list_inner,
+            font=("Segoe UI", 9),
+            bg=C["surface"], fg=C["text"],
+            selectbackground=C["tree_sel"], selectforeground=C["text"],
+            relief="flat", bd=0, activestyle="none",
+            yscrollcommand=listbox_scroll.set,
+            highlightthickness=0)
+        listbox_scroll.config(command=self.files_listbox.yview)
+        listbox_scroll.pack(side="right", fill="y")
+        self.files_listbox.pack(fill="both", expand=True)
+        self.files_listbox.bind("<<ListboxSelect>>", self._on_file_select)
+        paned.add(list_outer, weight=1)
+
+        # Preview / Treeview
+        tree_outer = tk.Frame(paned, bg=C["surface"])
+        tree_hdr = tk.Frame(tree_outer, bg=C["surface"], padx=10, pady=6)
+        tree_hdr.pack(fill="x")
+        tk.Label(tree_hdr, text="📖  PREVIEW DO DICIONÁRIO",
+                 bg=C["surface"], fg=C["accent"],
+                 font=("Segoe UI", 8, "bold")).pack(side="left")
+        tk.Frame(tree_outer, bg=C["border"], height=1).pack(fill="x", padx=10)
+
+        tree_inner = tk.Frame(tree_outer, bg=C["surface"], padx=8, pady=8)
+        tree_inner.pack(fill="both", expand=True)
+
+        tree_scroll_y = ttk.Scrollbar(tree_inner, orient="vertical")
+        tree_scroll_x = ttk.Scrollbar(tree_inner, orient="horizontal")
+        self.tree = ttk.Treeview(tree_inner,
+                                  columns=("idx", "orig", "trans"),
+                                  show="headings",
+                                  yscrollcommand=tree_scroll_y.set,
+                                  xscrollcommand=tree_scroll_x.set)
+        for col, txt, w, anchor in [
+            ("idx",  "№",            50,  "center"),
+            ("orig", "Original (A)", 340, "w"),
+            ("trans","Tradução (B)", 340, "w"),
+        ]:
+            self.tree.heading(col, text=txt)
+            self.tree.column(col, width=w, anchor=anchor, minwidth=40)
+
+        tree_scroll_y.config(command=self.tree.yview)
+        tree_scroll_x.config(command=self.tree.xview)
+        tree_scroll_y.pack(side="right", fill="y")
+        tree_scroll_x.pack(side="bottom", fill="x")
+        self.tree.pack(fill="both", expand=True)
+        paned.add(tree_outer, weight=3)
+        self._apply_treeview_stripes()
+        STARTUP.mark("app: painéis secundários")
+        if STARTUP.enabled:
+            self.after(0, self._report_startup)
+
+    def _report_startup(self):
+        STARTUP.mark("app: interativa")
+        self._log("Tempos de inicialização:", "INFO")
+        for line in STARTUP.lines():
+            self._log("  " + line, "DIM")
+            print(line, file=sys.stderr)
+
     # ── Log ──────────────────────────────────────────────────────────────────
     def _log(self, message, level="INFO"):
         self.log_text.config(state="normal")
@@ -983,12 +4839,84 @@ class TextMapperApp(tk.Tk):
         self.log_text.config(state="disabled")
 
     def _update_status(self):
-        mode = "Conteúdo" if self.mapping_mode.get() == "content" else "Posicional"
+        mode = MAPPING_MODES.get(self.mapping_mode.get(), "Conteúdo")
         txt = (f"  ●  {mode}  •  "
                f"{self._status_mapped} arquivos mapeados  •  "
                f"{self._status_processed} processados")
         self.status_label.configure(text=txt)
 
+    # ── Métricas ao vivo ─────────────────────────────────────────────────────
+    METRICS_INTERVAL_MS = 500
+
+    def _start_metrics(self, stats):
+        """Passa a amostrar `stats` (contadores do worker) num timer da UI."""
+        self._live_stats = stats
+        if getattr(self, "_metrics_job", None) is None:
+            self._metrics_job = self.after(self.METRICS_INTERVAL_MS, self._poll_metrics)
+
+    def _stop_metrics(self):
+        stats = getattr(self, "_live_stats", None)
+        if stats is not None:
+            self._render_metrics(stats)
+        self._live_stats = None
+        job = getattr(self, "_metrics_job", None)
+        if job is not None:
+            try: self.after_cancel(job)
+            except Exception: pass
+        self._metrics_job = None
+
+    def _poll_metrics(self):
+        self._metrics_job = None
+        stats = getattr(self, "_live_stats", None)
+        if stats is None:
+            return
+        self._render_metrics(stats)
+        self._metrics_job = self.after(self.METRICS_INTERVAL_MS, self._poll_metrics)
+
+    def _render_metrics(self, stats):
+        cnt   = stats.counters
+        secs  = max(stats.now(), 1e-6)
+        files = cnt.get("arquivos", 0)
+        lines = cnt.get("linhas", 0) + stats.current_line
+        mb_in = cnt.get("bytes_lidos", 0) / 1048576
+        mb_out= cnt.get("bytes_escritos", 0) / 1048576
+        txt_rate = (f"{files / secs:6.1f} arq/s  {lines / secs:8.0f} lin/s  "
+                    f"R {mb_in / secs:5.2f} MB/s  W {mb_out / secs:5.2f} MB/s")
+
+        exact, tmpl, fuzzy, fail = (cnt.get("exatas", 0), cnt.get("modelos", 0),
+                                    cnt.get("fuzzy", 0), cnt.get("falhas", 0))
+        decided = exact + tmpl + fuzzy + fail
+        if decided:
+            txt_hits = f"exatas {exact / decided:4.0%}  "
+            if tmpl:
+                txt_hits += f"modelos {tmpl / decided:4.0%}  "
+            txt_hits += f"fuzzy {fuzzy / decided:4.0%}  falhas {fail / decided:4.0%}"
+        else:
+            txt_hits = "exatas –  fuzzy –  falhas –"
+
+        current = stats.current
+        slow_rel, slow_secs = stats.slowest
+        if current is not None:
+            rel, t0 = current
+            txt_cur = f"em andamento: {rel} ({time.perf_counter() - t0:.1f}s, L{stats.current_line})"
+        elif slow_rel:
+            txt_cur = f"mais lento: {slow_rel} ({slow_secs:.1f}s)"
+        else:
+            txt_cur = ""
+
+        remaining = stats.total_bytes - stats.done_bytes
+        if stats.elapsed:
+            txt_eta = f"total {stats.elapsed:.1f}s"
+        elif stats.done_bytes and remaining > 0:
+            eta = remaining / (stats.done_bytes / secs)
+            txt_eta = f"ETA {int(eta // 3600):d}:{int(eta % 3600 // 60):02d}:{int(eta % 60):02d}"
+        else:
+            txt_eta = "ETA –"
+
+        for key, txt in (("rate", txt_rate), ("hits", txt_hits),
+                         ("current", txt_cur), ("eta", txt_eta)):
+            self.metrics_labels[key].configure(text=txt)
+
     def _update_progress(self, val, maximum):
         self.progress.config(maximum=maximum, value=val)
         pct = int(val / maximum * 100) if maximum else 0
@@ -1000,10 +4928,18 @@ class TextMapperApp(tk.Tk):
         if path:
             var.set(path)
 
-    def _get_pattern(self):
-        ext = self.file_extension.get().strip()
-        if not ext.startswith("."): ext = "." + ext
-        return f"**/*{ext}" if self.recursive_search.get() else f"*{ext}"
+    def _select_archive(self, var):
+        path = filedialog.askopenfilename(
+            title="Selecione o pacote",
+            filetypes=[("Pacotes", "*.zip *.tar *.tar.gz *.tgz *.gz"), ("Todos", "*.*")])
+        if path:
+            var.set(path)
+
+    def _make_scan_filter(self):
+        return ScanFilter(parse_extensions(self.file_extension.get()),
+                          recursive=self.recursive_search.get(),
+                          include=self.include_globs.get().split(),
+                          exclude=self.exclude_globs.get().split())
 
     def _update_fuzzy_label(self, val):
         self.fuzzy_val_label.configure(text=f"{float(val):.0f}%")
@@ -1013,9 +4949,11 @@ class TextMapperApp(tk.Tk):
         if mode == "positional":
             self.validate_check.config(state="normal",
                                         text="Validar similaridade na posição (usar limiar)")
+            self.realign_check.config(state="normal")
         else:
             self.validate_check.config(state="disabled",
                                         text="Validar orig. em C")
+            self.realign_check.config(state="disabled")
         self.fuzzy_scale.config(state="normal")
         self._update_status()
 
@@ -1044,139 +4982,427 @@ class TextMapperApp(tk.Tk):
             if not self.brute_force_by_order.get():
                 self.match_by_filename_only_check.config(state="normal")
 
-    # ── Leitura de arquivo ────────────────────────────────────────────────────
-    def _read_file(self, path, fallback_var, force_encoding=None):
-        try:
-            if force_encoding is not None:
-                with open(path, "r", encoding=force_encoding) as f:
-                    return f.read().splitlines(keepends=True)
-            with open(path, "rb") as f:
-                raw = f.read()
-        except Exception as e:
-            self._log(f"Erro ao ler {path}: {e}", "ERROR")
-            return ["<ERRO>\n"]
+    # ── Execução / cancelamento ───────────────────────────────────────────────
+    def _start_worker(self, target, kind):
+        """Dispara o worker numa thread daemon com um novo token de cancelamento.
+
+        Uma construção pode rodar ao lado de uma aplicação: cada uma segue
+        com a versão dos dicionários que pegou. Devolve o token.
+        """
+        token  = CancelToken()
+        thread = threading.Thread(target=target, args=(token,), daemon=True)
+        self._workers[token] = (kind, thread)
+        self.btn_cancel.config_state("normal")
+        thread.start()
+        return token
+
+    def _running(self, kind):
+        return any(k == kind for k, _ in self._workers.values())
+
+    def _log_worker_error(self, what):
+        """Registra a exceção em tratamento num worker (chamar dentro do except)."""
+        import traceback
+        exc = sys.exc_info()[1]
+        self._log_async(f"Erro inesperado {what}: {type(exc).__name__}: {exc}", "ERROR")
+        for line in traceback.format_exc().rstrip().splitlines():
+            self._log_async(line, "DIM")
+
+    def _worker_done(self, token):
+        self._workers.pop(token, None)
+        if not self._workers:
+            self.btn_cancel.config_state("disabled")
+        if self._watcher is not None:
+            # Lote que chegou durante a execução
+            self.after(0, self._watch_kick)
+
+    def _cancel_run(self):
+        pending = [t for t in self._workers if not t.cancelled]
+        if pending:
+            for token in pending:
+                token.cancel()
+            self.btn_cancel.config_state("disabled")
+            self.progress_label.configure(text="Cancelando...")
+            self._log("Cancelamento solicitado; aguardando o arquivo atual...", "WARN")
+
+    def _alive_workers(self):
+        return [t for _, t in self._workers.values() if t.is_alive()]
+
+    def _on_close(self):
+        """Fechar a janela cancela a execução e espera o checkpoint ser gravado."""
+        self._stop_watch()
+        self._stop_server()
+        if self._alive_workers():
+            self._closing = True
+            self._cancel_run()
+            self._wait_and_close()
+        else:
+            self.destroy()
 
-        if not raw: return ["\n"]
+    def _wait_and_close(self):
+        # Não usa join(): o worker ainda precisa do mainloop para os after().
+        if self._alive_workers():
+            self.after(100, self._wait_and_close)
+        else:
+            self.destroy()
 
-        bom_map = {b"\xef\xbb\xbf": "utf-8-sig",
-                   b"\xff\xfe":     "utf-16-le",
-                   b"\xfe\xff":     "utf-16-be"}
-        for bom, enc in bom_map.items():
-            if raw.startswith(bom):
-                try: return raw.decode(enc).splitlines(keepends=True)
-                except: pass
+    # ── Modo observação ───────────────────────────────────────────────────────
+    def _toggle_watch(self):
+        if not self.watch_mode.get():
+            self._stop_watch("Observação encerrada.")
+            return
+        if not (self.folder_a.get() and self.folder_b.get() and self.folder_c.get()):
+            messagebox.showerror("Erro", "Selecione as pastas A, B e C para observar.")
+            self.watch_mode.set(False)
+            return
+        if self.archive_output.get():
+            messagebox.showerror("Erro", "O modo observação grava arquivo a arquivo;\n"
+                                 "desmarque \"Saída .zip\".")
+            self.watch_mode.set(False)
+            return
+        flt = self._make_scan_filter()
+        self._watch_pending = {"a": set(), "b": set(), "c": set()}
+        self._watch_changed_ab = set()
+        self._watch_changed_c  = set()
+        self._watch_issues  = {}
+        self._watch_phrases = {}
+        self._watcher = FolderWatcher(
+            {"a": self.folder_a.get(), "b": self.folder_b.get(), "c": self.folder_c.get()},
+            flt, self._on_watch_batch,
+            on_error=lambda key, e: self.after(0, lambda: self._log(
+                f"Observação: erro ao ler {key.upper()}: {e}", "WARN")))
+        self._watcher.start()
+        self._log(f"Observando A, B e C (a cada {WATCH_INTERVAL:.0f}s; lote após "
+                  f"{WATCH_QUIET:.0f}s sem mudanças).", "INFO")
+        # Primeira rodada deixa dicionários e saída em dia com as pastas atuais
+        self._watch_pending["c"].add(None)
+        if not self.mappings:
+            self._watch_pending["a"].add(None)
+        self._watch_kick()
+
+    def _stop_watch(self, message=None):
+        if self._watcher is None:
+            return
+        self._watcher.stop()
+        self._watcher = None
+        self.watch_mode.set(False)
+        if message:
+            self._log(message, "WARN")
+
+    def _on_watch_batch(self, batch):
+        """Chamado na thread do observador: repassa o lote para o loop de eventos."""
+        self.after(0, lambda: self._watch_enqueue(batch))
+
+    def _watch_enqueue(self, batch):
+        if self._watcher is None:
+            return
+        for key, rels in batch.items():
+            self._watch_pending[key] |= rels
+        self._log(f"Mudanças: A {len(batch['a'])}, B {len(batch['b'])}, "
+                  f"C {len(batch['c'])} arquivo(s).", "DIM")
+        self._watch_kick()
+
+    def _watch_kick(self):
+        """Processa o lote pendente se nenhuma execução estiver em andamento.
+
+        None no conjunto significa "tudo" (construção completa / C inteiro).
+        Pares A/B alterados são reconstruídos primeiro; a aplicação vem em
+        _watch_after_build com os arquivos de C afetados.
+        """
+        if self._watcher is None or self._workers:
+            return
+        if self.archive_output.get():
+            self._stop_watch("Observação encerrada: \"Saída .zip\" foi marcada.")
+            return
+        pending = self._watch_pending
+        changed_ab = pending["a"] | pending["b"]
+        if not changed_ab and not pending["c"]:
+            return
+        self._watch_pending = {"a": set(), "b": set(), "c": set()}
+        self._watch_changed_ab = changed_ab
+        self._watch_changed_c  = pending["c"]
+        if changed_ab:
+            if self.build_mappings(only=None if None in changed_ab else changed_ab,
+                                   watch=True) is None:      # pastas A/B sumiram etc.
+                self._stop_watch("Observação encerrada: não foi possível construir.")
+        else:
+            self._watch_after_build()
 
-        detector = chardet.UniversalDetector()
-        for line in raw.splitlines(keepends=True)[:200]:
-            detector.feed(line)
-            if detector.done: break
-        detector.close()
+    def _watch_after_build(self):
+        """Aplica em C só o que mudou ou depende de um dicionário refeito."""
+        if self._watcher is None:
+            return
+        changed_ab, changed_c = self._watch_changed_ab, self._watch_changed_c
+        self._watch_changed_ab, self._watch_changed_c = set(), set()
+        if (None in changed_ab or None in changed_c or self.brute_force_by_order.get()
+                or (changed_ab and self.unified_dict.get())):
+            # Dicionário usado por todos os arquivos (ou ordem de C): refaz C inteiro
+            only = None
+        elif self.match_by_filename_only.get():
+            names = {Path(k).name for k in changed_ab}
+            only  = lambda e: e.rel.lower() in changed_c or e.name.lower() in names
+        else:
+            only  = lambda e: e.rel.lower() in changed_c or e.rel.lower() in changed_ab
+        self.apply_mappings(only=only, watch=True)
 
-        if detector.result["encoding"] and detector.result["confidence"] > 0.8:
-            try: return raw.decode(detector.result["encoding"]).splitlines(keepends=True)
-            except: pass
+    # ── Servidor local ────────────────────────────────────────────────────────
+    def _toggle_server(self):
+        if not self.server_mode.get():
+            self._stop_server("Servidor local encerrado.")
+            return
+        if self.mapping_mode.get() == "positional":
+            messagebox.showerror("Erro", "O servidor local atende os modos Conteúdo e Frases.")
+            self.server_mode.set(False)
+            return
+        if not self.mappings:
+            # Constrói primeiro; _build_finished liga o servidor
+            self._log("Servidor local: construindo os dicionários antes de abrir a porta...", "INFO")
+            if self.build_mappings() is None:
+                self.server_mode.set(False)
+            return
+        self._refresh_server()
+
+    def _make_service(self):
+        options = self._make_options()
+        if options is None:
+            return None
+        # Uma nova construção troca self.mapset; o serviço fica com o atual
+        return TranslationService(self.mapset, options)
+
+    def _refresh_server(self):
+        """Liga o servidor ou troca o serviço dele pelos dicionários atuais."""
+        service = self._make_service()
+        if service is None:
+            self._stop_server()
+            return
+        if self._server is not None:
+            self._server.service = service
+            self._log("Servidor local: dicionários atualizados.", "INFO")
+            return
+        try:
+            port = int(self.server_port.get())
+            server = TranslationServer(service, port=port, log=self._log_async)
+            server.start()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Erro", f"Não foi possível abrir o servidor local:\n{e}")
+            self.server_mode.set(False)
+            return
+        self._server = server
+        self._log(f"Servidor local em {server.address} "
+                  f"(POST /translate/lines, /translate/file; GET /stats).", "OK")
 
-        for enc in ["utf-8", "cp1252", "utf-16", "latin-1", fallback_var.get().lower()]:
-            try: return raw.decode(enc).splitlines(keepends=True)
-            except: continue
+    def _stop_server(self, message=None):
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.stop()
+        self.server_mode.set(False)
+        if message:
+            self._log(message, "WARN")
+
+    # ── Opções e dicionários ──────────────────────────────────────────────────
+    def _log_async(self, message, level="INFO"):
+        """_log para as threads de trabalho (passa pelo loop de eventos)."""
+        self.after(0, lambda: self._log(message, level))
+
+    def _adopt_mapset(self, mapset):
+        """Passa a usar `mapset`; os atributos antigos apontam para os contêineres dele."""
+        self.mapset           = mapset
+        self.mappings         = mapset.mappings
+        self.mappings_by_name = mapset.by_name
+        self.mappings_list    = mapset.ordered
+        self.global_mapping   = mapset.merged    # Dicionário único mesclado de todos os pares A/B
+        self._mapped_rels     = mapset.rels      # rel minúsculo → rel (lista de arquivos)
+
+    def _make_ignore_rules(self):
+        """Compila prefixos/regex de ignorar; mostra erro e devolve None se inválidos."""
+        try:
+            return IgnoreRules(self.ignore_prefixes.get().split(),
+                               self.ignore_regex.get().split())
+        except re.error as e:
+            messagebox.showerror("Erro", f"Regex de ignorar inválida:\n{e}")
+            return None
+
+    def _make_normalizer(self):
+        return TextNormalizer(collapse_ws=self.norm_whitespace.get(),
+                              unicode_form="NFC" if self.norm_unicode.get() else None,
+                              casefold=self.norm_casefold.get())
+
+    def _make_options(self):
+        """MappingOptions com os valores atuais da janela; None se a regex de ignorar for inválida."""
+        ignore = self._make_ignore_rules()
+        if ignore is None:
+            return None
+        return MappingOptions(
+            mode=self.mapping_mode.get(), scan=self._make_scan_filter(), ignore=ignore,
+            normalizer=self._make_normalizer(), templates=self.template_match.get(),
+            fmt=FORMAT_LABELS.get(self.text_format.get()),
+            threshold=self.fuzzy_threshold.get() / 100.0,
+            by_name=self.match_by_filename_only.get(),
+            brute_force=self.brute_force_by_order.get(), unified=self.unified_dict.get(),
+            validate=self.validate_positional.get(), realign=self.realign_positional.get(),
+            encoding_ab=self.encoding_ab.get(), encoding_out=self.encoding_c_out.get(),
+            force_c=self.force_encoding_c.get(), byte_path=self.byte_path.get(),
+            lazy=self.lazy_build.get())
+
+    def _make_job(self):
+        """Congela as opções da janela para uma execução; None se forem inválidas."""
+        options = self._make_options()
+        if options is None:
+            return None
+        try:
+            read_ahead = int(self.read_ahead.get())
+            writers    = int(self.write_threads.get())
+            if read_ahead < 0 or writers < 0:
+                raise ValueError("use 0 ou mais")
+        except ValueError as e:
+            messagebox.showerror("Erro", f"Leitura antecipada/gravadores inválidos:\n{e}")
+            return None
+        return JobConfig(self.folder_a.get(), self.folder_b.get(), self.folder_c.get(),
+                         options, zip_output=self.archive_output.get(),
+                         format_label=self.text_format.get(),
+                         profile=self.profile_run.get(),
+                         track_memory=self.memory_profile.get(),
+                         decision_cache=self.decision_cache.get(),
+                         read_ahead=read_ahead, writers=writers)
 
-        return raw.decode("utf-8", errors="replace").splitlines(keepends=True)
+    # ── Build Mappings ────────────────────────────────────────────────────────
+    def build_mappings(self, only=None, watch=False):
+        """Constrói os dicionários A↔B.
 
-    def _should_ignore(self, line, prefixes):
-        if not prefixes: return False
-        stripped = line.lstrip()
-        for p in prefixes:
-            if p and stripped.startswith(p): return True
-        return False
+        `only` (conjunto de rel minúsculos) reconstrói só esses pares e mantém
+        os demais; pares que sumiram de A ou B são removidos. `watch` marca a
+        execução como disparada pelo modo observação (sem diálogos).
 
-    # ── Build Mappings ────────────────────────────────────────────────────────
-    def build_mappings(self):
+        A versão atual continua publicada (prévia, aplicação, servidor) até a
+        nova ficar pronta. Devolve o token da execução, ou None se não começou.
+        """
+        self._build_deferred()
         if not self.folder_a.get() or not self.folder_b.get():
-            messagebox.showerror("Erro", "Selecione as pastas A e B.")
+            if not watch:
+                messagebox.showerror("Erro", "Selecione as pastas A e B.")
             return
 
-        pattern = self._get_pattern()
-        mode    = self.mapping_mode.get()
-        prefixes= self.ignore_prefixes.get().split()
+        job = self._make_job()
+        if job is None:
+            return
+        options = job.options
 
         self.btn_build.config_state("disabled")
+        # Com uma aplicação em andamento, a barra e as métricas ficam com ela
+        background = self._running("apply")
+
+        if not background:
+            self.progress_label.configure(text="Construindo mapeamentos...")
+        if only is not None:
+            self._log(f"Observação: reconstruindo {len(only)} par(es) A/B...", "INFO")
+        elif background:
+            self._log(f"Construindo nova versão dos dicionários; a aplicação em andamento "
+                      f"segue na versão {self.mapset.version}.", "INFO")
+        else:
+            self._log("Iniciando construção dos mapeamentos A↔B...", "INFO")
+
+        stats        = RunStats("Construção")
+        base         = self.mapset
+        if not background:
+            self._start_metrics(stats)
+
+        def progress(done, total, rel):
+            if not background:
+                self.after(0, lambda: self._update_progress(done, total or 1))
+
+        def work(token):
+            profiler = RunProfiler() if job.profile else None
+            memprof  = MemoryProfiler("Construção") if job.track_memory else None
+            if profiler: profiler.start()
+            if memprof:  memprof.start()
+
+            mapset = build(job.folder_a, job.folder_b, options, progress, token, stats,
+                           self._log_async, only, base, memprof)
+
+            stats.finish()
+            if memprof:
+                memprof.snapshot("construção")
+                memprof.measure(mapset.containers())
+                memprof.stop()
+            prof_files = None
+            if profiler:
+                stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                prof_files = profiler.stop(Path(job.folder_a).parent / f"perfil_construcao_{stamp}")
+            cancelled = token.cancelled
+            return lambda: self._build_finished(stats, prof_files, memprof, cancelled,
+                                                watch=watch, mapset=mapset, token=token)
+
+        def worker(token):
+            finish = lambda: self._build_finished(stats, watch=watch, token=token, failed=True)
+            try:
+                finish = work(token)
+            except Exception:
+                self._log_worker_error("na construção")
+            finally:
+                self.after(0, finish)
+
+        return self._start_worker(worker, "build")
+
+    def _log_run_stats(self, stats, prof_files=None):
+        """Escreve o resumo de desempenho no console (e os arquivos de perfil)."""
+        for line in stats.summary_lines():
+            self._log(line, "DIM")
+        if prof_files and prof_files[0]:
+            self._log(f"Perfil salvo: {prof_files[0]}", "INFO")
+            self._log(f"Pilhas colapsadas (flamegraph): {prof_files[1]}", "INFO")
+            # Perfil é de uma execução só: desarma a opção após usar
+            self.profile_run.set(False)
+
+    def _build_finished(self, stats=None, prof_files=None, memprof=None, cancelled=False,
+                        watch=False, mapset=None, token=None, failed=False):
+        background = self._running("apply")
+        if not background:
+            self._stop_metrics()
+        self._worker_done(token)
+        self.btn_build.config_state("normal")
+        if failed:
+            # A observação continua: o próximo lote de alterações tenta de novo
+            if self.server_mode.get() and self._server is None:
+                self.server_mode.set(False)
+            self.progress_label.configure(text="Construção interrompida por erro.")
+            self._log(f"Construção interrompida por erro; mantida a versão "
+                      f"{self.mapset.version} dos dicionários.", "ERROR")
+            return
+        if cancelled and watch:
+            self._stop_watch("Observação encerrada: construção cancelada.")
+        if cancelled:
+            # Construção parcial não é publicada: segue a versão anterior
+            if self.server_mode.get() and self._server is None:
+                self.server_mode.set(False)
+            self.progress_label.configure(text="Construção cancelada.")
+            self._log(f"Construção cancelada; mantida a versão {self.mapset.version} "
+                      f"dos dicionários.", "WARN")
+            return
+        # Publica a nova versão: quem já pegou a anterior continua nela
+        self._adopt_mapset(mapset)
         self.files_listbox.delete(0, "end")
         self.tree.delete(*self.tree.get_children())
-        self.mappings.clear()
-        self.mappings_by_name.clear()
-        self.mappings_list = []
-        self.global_mapping = {}   # Resetar dicionário único
-        self._status_mapped = 0
-
-        self.progress_label.configure(text="Construindo mapeamentos...")
-        self._log("Iniciando construção dos mapeamentos A↔B...", "INFO")
-
-        def worker():
-            path_a = Path(self.folder_a.get())
-            path_b = Path(self.folder_b.get())
-            files_a = {f.relative_to(path_a).as_posix().lower(): f
-                       for f in path_a.glob(pattern)}
-            files_b = {f.relative_to(path_b).as_posix().lower(): f
-                       for f in path_b.glob(pattern)}
-
-            common = sorted(set(files_a.keys()) & set(files_b.keys()), key=str.lower)
-            total  = len(common)
-            self.after(0, lambda: self._update_progress(0, total or 1))
-
-            self.mappings_list = []
-
-            for i, rel_lower in enumerate(common):
-                file_a = files_a[rel_lower]
-                file_b = files_b[rel_lower]
-                rel    = file_a.relative_to(path_a).as_posix()
-
-                lines_a = self._read_file(file_a, self.encoding_ab)
-                lines_b = self._read_file(file_b, self.encoding_ab)
-
-                mapping = []
-                for la, lb in zip(lines_a, lines_b):
-                    orig  = la.rstrip("\n\r")
-                    trans = lb.rstrip("\n\r")
-                    if self._should_ignore(orig, prefixes): continue
-                    mapping.append({"orig": orig, "trans": trans})
-
-                if mode == "content":
-                    content_map = {}
-                    for item in mapping:
-                        if item["trans"] is not None:
-                            v = item["trans"]
-                            content_map[item["orig"]] = v + "\n" if not v.endswith("\n") else v
-                    self.mappings[rel_lower]      = content_map
-                    self.mappings_list.append(content_map)
-                else:
-                    self.mappings[rel_lower] = mapping
-                    self.mappings_list.append(mapping)
-
-                fname_lower = Path(rel).name.lower()
-                if fname_lower not in self.mappings_by_name:
-                    self.mappings_by_name[fname_lower] = self.mappings[rel_lower]
-
-                # Acumular no dicionário único (modo conteúdo)
-                if mode == "content":
-                    self.global_mapping.update(self.mappings[rel_lower])
-
-                tag = "odd" if i % 2 == 0 else "even"
-                self.after(0, lambda d=rel, t=tag: self.files_listbox.insert("end", d))
-                self.after(0, lambda v=i+1, mx=total: self._update_progress(v, mx or 1))
-
-            self.after(0, self._build_finished)
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def _build_finished(self):
-        self.btn_build.config_state("normal")
-        if self.mappings:
+        for k in sorted(self._mapped_rels):
+            self.files_listbox.insert("end", self._mapped_rels[k])
+        if self.mappings and not background:
             self.btn_apply.config_state("normal")
         self._status_mapped = len(self.mappings)
-        self._status_processed = 0
+        if not background:
+            self._status_processed = 0
+            self.progress_label.configure(text="Mapeamento concluído.")
         self._update_status()
-        self.progress_label.configure(text="Mapeamento concluído.")
-        self._log(f"Concluído: {len(self.mappings)} arquivo(s) mapeado(s).", "OK")
+        self._log(f"Concluído: {len(self.mappings)} arquivo(s) mapeado(s) "
+                  f"(versão {mapset.version}).", "OK")
+        if stats is not None and not watch:
+            self._log_run_stats(stats, prof_files)
+        self._last_build_memory = memprof.summary_lines() if memprof else []
+        for line in self._last_build_memory:
+            self._log(line, "DIM")
+        if self.server_mode.get() and self.mapping_mode.get() != "positional":
+            self._refresh_server()
+        if watch:
+            self._watch_after_build()
+            return
         messagebox.showinfo("Sucesso",
                             f"Dicionários criados!\n{len(self.mappings)} arquivo(s) mapeado(s).")
 
@@ -1184,13 +5410,13 @@ class TextMapperApp(tk.Tk):
         sel = self.files_listbox.curselection()
         if not sel: return
         fname   = self.files_listbox.get(sel[0])
-        mapping = self.mappings.get(fname.lower())
+        mapping = self.mapset.get(fname.lower())
         if not mapping: return
 
         mode = self.mapping_mode.get()
         self.tree.delete(*self.tree.get_children())
 
-        if mode == "content" and isinstance(mapping, dict):
+        if mode != "positional" and isinstance(mapping, dict):
             for idx, (orig, trans) in enumerate(mapping.items(), 1):
                 tag = "odd" if idx % 2 == 0 else "even"
                 self.tree.insert("", "end", values=(idx, orig, trans), tags=(tag,))
@@ -1207,161 +5433,179 @@ class TextMapperApp(tk.Tk):
         self._apply_treeview_stripes()
 
     # ── Apply Mappings ────────────────────────────────────────────────────────
-    def apply_mappings(self):
+    def apply_mappings(self, only=None, watch=False):
+        """Aplica os dicionários em C e grava a saída _TRA e o relatório.
+
+        `only(entry)` restringe os arquivos de C processados (os demais mantêm
+        a saída anterior). Com `watch` não há diálogos nem checkpoint, e o
+        relatório é acumulado entre as rodadas do modo observação.
+        """
         if not self.folder_c.get():
-            messagebox.showerror("Erro", "Selecione a pasta C.")
+            if not watch:
+                messagebox.showerror("Erro", "Selecione a pasta C.")
             return
 
-        parent_dir   = Path(self.folder_c.get()).parent
-        out_dir_name = Path(self.folder_c.get()).name + "_TRA"
-        out_dir      = parent_dir / out_dir_name
-        out_dir.mkdir(exist_ok=True)
+        job = self._make_job()
+        if job is None:
+            return
+        options      = job.options
+        mapset       = self.mapset
+        parent_dir   = Path(job.folder_c).parent
+        out_dir_name = source_stem(job.folder_c) + "_TRA"
+        out_dir      = parent_dir / (out_dir_name + (".zip" if job.zip_output else ""))
         report_path  = parent_dir / f"relatorio_{out_dir_name}.txt"
+        ckpt_path    = parent_dir / f"relatorio_{out_dir_name}.checkpoint.json"
+
+        # Checkpoint de uma execução interrompida com as mesmas configurações?
+        checkpoint = None if watch else ApplyCheckpoint.load(ckpt_path, job.settings())
+        resume_done = {}
+        if checkpoint is not None and checkpoint.done:
+            answer = messagebox.askyesnocancel(
+                "Retomar aplicação",
+                f"Foi encontrada uma aplicação interrompida com "
+                f"{len(checkpoint.done)} arquivo(s) já concluído(s).\n\n"
+                f"Sim: retomar de onde parou\nNão: recomeçar do zero")
+            if answer is None:
+                return
+            if answer:
+                resume_done = checkpoint.done
+        checkpoint = ApplyCheckpoint(ckpt_path, job.settings(), resume_done)
+
+        import zipfile
+        try:
+            if job.zip_output:
+                sink = ZipSink(out_dir, resume=bool(resume_done))
+            else:
+                out_dir.mkdir(exist_ok=True)
+                sink = DirSink(out_dir)
+        except (OSError, zipfile.BadZipFile) as e:
+            messagebox.showerror("Erro", f"Não foi possível criar a saída:\n{out_dir}\n\n{e}")
+            return
 
         self.btn_apply.config_state("disabled")
-        mode        = self.mapping_mode.get()
-        by_name     = self.match_by_filename_only.get()
-        threshold   = self.fuzzy_threshold.get() / 100.0
-        brute_force = self.brute_force_by_order.get()
-        use_unified = self.unified_dict.get()
-        prefixes    = self.ignore_prefixes.get().split()
 
         self.progress_label.configure(text="Aplicando traduções em C...")
 
-        if use_unified:
-            n = len(self.global_mapping)
+        if watch:
+            pass
+        elif options.unified:
+            n = len(mapset.merged)
             self._log(f"Dicionário Único ativo: {n} entradas mescladas de todos os pares A/B.", "INFO")
         else:
             self._log("Iniciando aplicação em C...", "INFO")
 
-        def worker():
-            pattern     = self._get_pattern()
-            files_c     = sorted(Path(self.folder_c.get()).glob(pattern),
-                                  key=lambda x: x.name.lower())
-            total       = len(files_c)
-            untranslated= {}
-            processed   = 0
-
-            self.after(0, lambda: self._update_progress(0, total or 1))
-
-            force_enc_c = self.encoding_c_out.get() if self.force_encoding_c.get() else None
-            if force_enc_c:
-                self._log(f"Forçando codificação em C: {force_enc_c}", "WARN")
-
-            for i, file_c in enumerate(files_c):
-                rel       = file_c.relative_to(Path(self.folder_c.get())).as_posix()
-                rel_lower = rel.lower()
-
-                if use_unified:
-                    # Dicionário único: um só dict para todos os arquivos C
-                    mapping = self.global_mapping if self.global_mapping else None
-                    if not mapping:
-                        self._log(
-                            f"Dicionário único vazio! Reconstrua os mapeamentos.", "ERROR")
-                elif brute_force:
-                    mapping = self.mappings_list[i] if i < len(self.mappings_list) else None
-                    if not mapping:
-                        self._log(f"Sem mapeamento para '{rel}' (índice {i})", "WARN")
-                else:
-                    mapping = (self.mappings_by_name.get(file_c.name.lower()) if by_name
-                               else self.mappings.get(rel_lower))
-
-                lines_c                   = self._read_file(file_c, self.encoding_c_out, force_enc_c)
-                output, issues_fail, issues_fuzzy = [], [], []
-
-                if not mapping:
-                    output = [line.rstrip("\r\n") + "\n" for line in lines_c]
-                    issues_fail.append("[!] Sem mapeamento encontrado.")
-                else:
-                    if mode == "content":
-                        if isinstance(mapping, list):
-                            content_map = {}
-                            for item in mapping:
-                                if item["trans"] is not None:
-                                    v = item["trans"]
-                                    content_map[item["orig"]] = v + "\n" if not v.endswith("\n") else v
-                            mapping = content_map
-                        keys = list(mapping.keys())
-                        for idx, line in enumerate(lines_c, 1):
-                            s = line.rstrip("\r\n")
-                            if not s or self._should_ignore(line, prefixes):
-                                output.append(s + "\n"); continue
-                            if s in mapping:
-                                output.append(mapping[s]); continue
-                            if threshold < 1.0:
-                                matches = difflib.get_close_matches(s, keys, n=1, cutoff=threshold)
-                                if matches:
-                                    best = matches[0]
-                                    sim  = difflib.SequenceMatcher(None, s, best).ratio()
-                                    output.append(mapping[best])
-                                    issues_fuzzy.append(
-                                        f'L{idx}: [FUZZY {sim*100:.0f}%] "{s}" → "{best}"')
-                                    continue
-                            output.append(s + "\n")
-                            issues_fail.append(f'L{idx}: [FALHA] "{s}"')
-                    else:
-                        if isinstance(mapping, dict):
-                            mapping = [{"orig": k, "trans": v} for k, v in mapping.items()]
-                        for idx, line in enumerate(lines_c, 1):
-                            s = line.rstrip("\r\n")
-                            if not s or self._should_ignore(line, prefixes):
-                                output.append(s + "\n"); continue
-                            map_idx = idx - 1
-                            if map_idx < len(mapping):
-                                item   = mapping[map_idx]
-                                orig_s = item["orig"].strip() if item["orig"] else ""
-                                if not self.validate_positional.get():
-                                    t = item["trans"]
-                                    output.append(t + "\n" if t and not t.endswith("\n")
-                                                  else (t or s + "\n"))
-                                else:
-                                    sim = difflib.SequenceMatcher(None, s, orig_s).ratio()
-                                    if sim >= threshold:
-                                        t = item["trans"]
-                                        output.append(t + "\n" if t and not t.endswith("\n")
-                                                      else (t or s + "\n"))
-                                        if sim < 1.0:
-                                            issues_fuzzy.append(
-                                                f'L{idx}: [FUZZY POSICIONAL {sim*100:.0f}%]')
-                                    else:
-                                        output.append(s + "\n")
-                                        issues_fail.append(
-                                            f'L{idx}: [FALHA POSICIONAL {sim*100:.0f}%]')
-                            else:
-                                output.append(s + "\n")
-                                issues_fail.append(f"L{idx}: [FORA DE ÍNDICE]")
-
-                out_file = out_dir / rel
-                out_file.parent.mkdir(parents=True, exist_ok=True)
+        build_memory = list(self._last_build_memory)
+        stats        = RunStats("Aplicação")
+        self._start_metrics(stats)
+        if resume_done:
+            self._log(f"Retomando: {len(resume_done)} arquivo(s) do checkpoint serão pulados.", "INFO")
+
+        def progress(done, total, rel):
+            self.after(0, lambda: self._update_progress(done, total or 1))
+
+        def work(token):
+            profiler = RunProfiler() if job.profile else None
+            memprof  = MemoryProfiler("Aplicação") if job.track_memory else None
+            if profiler: profiler.start()
+            if memprof:  memprof.start()
+
+            with stats.timer("scan"):
+                files_c = scan_targets(job.folder_c, options, self._log_async)
+            if memprof: memprof.snapshot("varredura")
+            untranslated  = {}
+            phrase_counts = {}   # modo frases: rel → nº de substituições
+            if watch:
+                # Relatório acumulado: mantém o resultado dos arquivos não refeitos
+                present = {e.rel for e in files_c}
+                redo    = {e.rel for e in files_c if only is None or only(e)}
+                untranslated  = {r: v for r, v in self._watch_issues.items()
+                                 if r in present and r not in redo}
+                phrase_counts = {r: n for r, n in self._watch_phrases.items()
+                                 if r in present and r not in redo}
+            processed = 0
+            resumed   = 0
+            same_as   = {}   # rel → arquivo idêntico já traduzido
+
+            if options.force_c:
+                self._log_async(f"Forçando codificação em C: {options.encoding_out}", "WARN")
+
+            cache = None
+            if job.decision_cache and options.mode == "content" and options.threshold < 1.0:
                 try:
-                    with open(out_file, "w", encoding=self.encoding_c_out.get()) as f:
-                        f.writelines(output)
+                    import sqlite3
+                    cache = DecisionCache(get_exe_dir() / DECISION_CACHE_FILE)
+                except ImportError as e:
+                    self._log_async(f"Cache de decisões indisponível: {e}", "WARN")
+                except (sqlite3.Error, OSError) as e:
+                    self._log_async(f"Cache de decisões indisponível: {e}", "WARN")
+
+            for res in apply(files_c, mapset, options, sink, only, resume_done, progress,
+                             token, stats, self._log_async, memprof, cache,
+                             job.read_ahead, job.writers):
+                if res.ok:
                     processed += 1
-                except Exception as e:
-                    self._log(f"Erro ao salvar {out_file}: {e}", "ERROR")
-
-                if issues_fail or issues_fuzzy:
-                    untranslated[rel] = issues_fail + issues_fuzzy
-
-                self.after(0, lambda v=i+1, mx=total: self._update_progress(v, mx or 1))
+                if res.resumed:
+                    resumed += 1
+                else:
+                    checkpoint.mark(res.rel, res.ok, res.issues)
+                if res.issues:
+                    untranslated[res.rel] = res.issues
+                if res.phrases:
+                    phrase_counts[res.rel] = res.phrases
+                if res.same_as:
+                    same_as[res.rel] = res.same_as
+            if cache is not None:
+                try:
+                    cache.close()
+                except sqlite3.Error as e:
+                    self._log_async(f"Cache de decisões: erro ao gravar: {e}", "WARN")
+            total = stats.total_files
+
+            stats.finish()
+            cancelled = token.cancelled
+            if watch:
+                self._watch_issues  = dict(untranslated)
+                self._watch_phrases = dict(phrase_counts)
+                checkpoint.discard()
+            elif cancelled:
+                checkpoint.save()
+            else:
+                checkpoint.discard()
+            mem_lines = []
+            if memprof:
+                memprof.snapshot("aplicação")
+                memprof.measure(mapset.containers())
+                mem_lines = build_memory + memprof.stop().summary_lines()
 
             # Relatório
             with open(report_path, "w", encoding="utf-8") as r:
-                brute_str    = "Sim" if brute_force else "Não"
-                unified_str  = "Sim" if use_unified else "Não"
-                validate_str = "Sim" if self.validate_positional.get() else "Não"
                 r.write(f"# RELATÓRIO v1.5.0 - {datetime.now().strftime('%d/%m/%Y %H:%M')}\n")
-                r.write(f"# Modo: {mode.capitalize()} | Validar: {validate_str} | "
-                        f"Limiar: {threshold*100:.0f}% | Busca: "
-                        f"{'Nome' if by_name else 'Estrutura'}\n")
-                r.write(f"# Brute Force: {brute_str} | Dicionário Único: {unified_str} | "
-                        f"Ignorar Prefixos: {' '.join(prefixes) or 'Nenhum'}\n")
-                r.write(f"# A/B mapeados: {len(self.mappings_list)} | "
-                        f"C processados: {len(files_c)}\n")
-                r.write(f"# Codificação A/B: {self.encoding_ab.get()} | "
-                        f"Saída: {self.encoding_c_out.get()}\n")
-                r.write(f"# Pasta de Saída: {out_dir_name}\n")
+                for line in job.report_header(mapset, len(files_c), out_dir.name):
+                    r.write(f"# {line}\n")
+                if resumed:
+                    r.write(f"# Retomada de checkpoint: {resumed} arquivo(s) reaproveitado(s)\n")
+                if watch:
+                    r.write(f"# Modo observação: {total} arquivo(s) refeito(s) nesta rodada; "
+                            f"problemas acumulados de todas as rodadas\n")
+                if cancelled:
+                    r.write(f"# EXECUÇÃO INTERROMPIDA: relatório parcial. Aplique novamente "
+                            f"para retomar de {ckpt_path.name}\n")
+                r.write("# " + "-" * 80 + "\n")
+                for line in stats.summary_lines() + mem_lines:
+                    r.write(f"# {line}\n")
                 r.write("# " + "=" * 80 + "\n\n")
+                if options.mode == "phrases":
+                    r.write(f"# SUBSTITUIÇÕES POR ARQUIVO ({len(phrase_counts)}, "
+                            f"{sum(phrase_counts.values())} no total):\n")
+                    for p, n in phrase_counts.items():
+                        r.write(f"  {p}: {n}\n")
+                    r.write("\n")
+                if same_as:
+                    r.write(f"# CONTEÚDO REPETIDO ({len(same_as)}): traduzido uma vez e "
+                            f"reaproveitado (mesmos problemas do original)\n")
+                    for p, src in same_as.items():
+                        r.write(f"  {p} = {src}\n")
+                    r.write("\n")
                 if untranslated:
                     r.write(f"# ARQUIVOS COM PROBLEMAS ({len(untranslated)}):\n")
                     for p, iss in untranslated.items():
@@ -1377,26 +5621,80 @@ class TextMapperApp(tk.Tk):
                     r.write("# TODOS OS ARQUIVOS FORAM TRADUZIDOS COM SUCESSO!\n")
                 r.write(f"\n# Total processados: {processed}\n")
                 r.write(f"# Com problemas: {len(untranslated)}\n")
-                if use_unified:
+                if options.unified:
                     r.write(f"\n# NOTA: Dicionário Único foi usado.\n")
-                    r.write(f"# Um único dicionário com {len(self.global_mapping)} entradas "
+                    r.write(f"# Um único dicionário com {len(mapset.merged)} entradas "
                             f"# foi aplicado a todos os {len(files_c)} arquivo(s) em C.\n")
-                if brute_force:
+                if options.brute_force:
                     r.write("\n# NOTA: Modo Brute Force (ORDEM) foi usado.\n")
 
-            self.after(0, lambda: self._apply_finished(processed, out_dir, report_path))
+            if not cancelled:
+                sink.add_file(report_path.name, report_path)
+            sink.close()
 
-        threading.Thread(target=worker, daemon=True).start()
+            prof_files = None
+            if profiler:
+                prof_files = profiler.stop(parent_dir / f"perfil_{out_dir_name}")
+            return lambda: self._apply_finished(processed, out_dir, report_path, stats,
+                                                prof_files, memprof, cancelled,
+                                                watch=watch, token=token)
 
-    def _apply_finished(self, count, out_dir, report):
+        def worker(token):
+            finish = lambda: self._apply_finished(0, out_dir, report_path, stats,
+                                                  watch=watch, token=token, failed=True)
+            try:
+                finish = work(token)
+            except Exception:
+                self._log_worker_error("na aplicação")
+                # O que já foi gravado continua retomável
+                try:
+                    sink.close()
+                    if not watch:
+                        checkpoint.save()
+                except Exception:
+                    pass
+            finally:
+                self.after(0, finish)
+
+        return self._start_worker(worker, "apply")
+
+    def _apply_finished(self, count, out_dir, report, stats=None, prof_files=None,
+                        memprof=None, cancelled=False, watch=False, token=None, failed=False):
+        self._stop_metrics()
+        self._worker_done(token)
         self.btn_apply.config_state("normal")
+        if failed:
+            self.progress_label.configure(text="Aplicação interrompida por erro.")
+            self._log("Aplicação interrompida por erro; veja os detalhes acima. O que já "
+                      "foi concluído pode ser retomado aplicando novamente.", "ERROR")
+            return
         self._last_report_path = report      # guarda para o botão 3
         self._last_out_dir     = out_dir
         self.btn_report.config_state("normal")
         self._status_processed = count
         self._update_status()
-        self.progress_label.configure(text=f"Concluído — {count} arquivo(s) processado(s).")
-        self._log(f"Tradução finalizada: {count} arquivo(s). Saída: {out_dir}", "OK")
+        if watch:
+            if cancelled:
+                self._stop_watch("Observação encerrada: aplicação cancelada.")
+            else:
+                dt = stats.elapsed if stats is not None else 0.0
+                self.progress_label.configure(text=f"Observando — {count} arquivo(s) atualizado(s).")
+                self._log(f"Observação: {count} arquivo(s) atualizado(s) em {dt:.2f}s.", "OK")
+            return
+        if cancelled:
+            self.progress_label.configure(text=f"Cancelado — {count} arquivo(s) concluído(s).")
+            self._log(f"Aplicação cancelada: {count} arquivo(s) concluído(s). Checkpoint salvo; "
+                      f"clique em Aplicar novamente para retomar.", "WARN")
+        else:
+            self.progress_label.configure(text=f"Concluído — {count} arquivo(s) processado(s).")
+            self._log(f"Tradução finalizada: {count} arquivo(s). Saída: {out_dir}", "OK")
+        if stats is not None:
+            self._log_run_stats(stats, prof_files)
+        if memprof is not None:
+            for line in memprof.summary_lines():
+                self._log(line, "DIM")
+        if cancelled or self._closing:
+            return
         messagebox.showinfo("Concluído!",
                             f"Tradução finalizada!\n{count} arquivo(s) processado(s).\n\n"
                             f"Relatório:\n{report}\n\nArquivos em:\n{out_dir}")
@@ -1451,6 +5749,11 @@ class TextMapperApp(tk.Tk):
         else:
             out_dir = Path(out_dir)
 
+        if out_dir.suffix.lower() == ".zip" and out_dir.is_file():
+            messagebox.showerror("Erro", "A saída desse relatório está num .zip.\n"
+                                 "Reaplique com a saída em pasta para corrigir as FALHAs.")
+            return
+
         if not out_dir.exists():
             # Tenta resolver pelo diretório do relatório
             out_dir = report_path.parent / out_dir.name
@@ -1647,6 +5950,7 @@ class TextMapperApp(tk.Tk):
                             lines[idx] = new_trans.rstrip("\r\n") + eol
                         else:
                             self._log(f"{fname}: Linha {lnum} fora do intervalo.", "WARN")
+                    break_hard_link(file_path)   # duplicado vinculado segue intacto
                     file_path.write_text("".join(lines), encoding=out_enc)
                     applied += 1
                     self._log(f"Corrigido: {fname} ({len(line_map)} linha(s))", "OK")
@@ -1785,6 +6089,9 @@ def get_exe_dir():
         return Path(sys.executable).parent
     return Path(__file__).resolve().parent
 
+SPLASH_MAX = (640, 420)   # maior tamanho exibido; imagens maiores são reduzidas
+
+
 class SplashWindow(tk.Tk):
     """Tela de splash estilizada com tema escuro premium para primeira inicialização."""
 
@@ -1799,36 +6106,19 @@ class SplashWindow(tk.Tk):
         
         self.app_dir = get_app_dir()
         self.image_path = self.app_dir / "splash.png"
+        self.cache_path = get_exe_dir() / "splash.cache.png"
         
         self.photo = None
-        has_image = False
-        
-        if self.image_path.exists():
-            try:
-                self.photo = tk.PhotoImage(file=str(self.image_path))
-                has_image = True
-            except Exception as e:
-                pass
+        has_image = self.image_path.exists()
 
-        # Dimensões dinâmicas: se houver imagem, calcula a altura necessária (imagem + botão)
-        if has_image:
-            img_w = self.photo.width()
-            img_h = self.photo.height()
-            w = max(500, img_w + 40)
-            h = img_h + 130
-        else:
-            w, h = 500, 360
-            
-        sw = self.winfo_screenwidth()
-        sh = self.winfo_screenheight()
-        x = (sw - w) // 2
-        y = (sh - h) // 2
-        self.geometry(f"{w}x{h}+{x}+{y}")
+        # A imagem é decodificada depois que a janela aparece (ver _load_image)
+        self._center(500, 360)
         self.resizable(False, False)
         
         if has_image:
-            self.lbl_img = tk.Label(self, image=self.photo, bg="#0D1117")
+            self.lbl_img = tk.Label(self, bg="#0D1117")
             self.lbl_img.pack(pady=(20, 10))
+            self.after(1, self._load_image)
         else:
             self._show_fallback()
             
@@ -1848,6 +6138,35 @@ class SplashWindow(tk.Tk):
         self.btn.bind("<Enter>", lambda e: self.btn.configure(bg="#9D5CF8"))
         self.btn.bind("<Leave>", lambda e: self.btn.configure(bg="#7C3AED"))
 
+    def _center(self, w, h):
+        sw = self.winfo_screenwidth()
+        sh = self.winfo_screenheight()
+        self.geometry(f"{w}x{h}+{(sw - w) // 2}+{(sh - h) // 2}")
+
+    def _load_image(self):
+        """Carrega o splash já reduzido do cache; senão decodifica, reduz e grava o cache."""
+        try:
+            fresh = (self.cache_path.exists() and
+                     self.cache_path.stat().st_mtime >= self.image_path.stat().st_mtime)
+            if fresh:
+                self.photo = tk.PhotoImage(file=str(self.cache_path))
+            else:
+                photo = tk.PhotoImage(file=str(self.image_path))
+                k = max(-(-photo.width() // SPLASH_MAX[0]), -(-photo.height() // SPLASH_MAX[1]))
+                self.photo = photo.subsample(k) if k > 1 else photo
+                try:
+                    self.photo.write(str(self.cache_path), format="png")
+                except tk.TclError:
+                    pass
+        except (tk.TclError, OSError):
+            self.lbl_img.destroy()
+            self._show_fallback()
+            return
+        STARTUP.mark("splash: imagem")
+        self.lbl_img.configure(image=self.photo)
+        # Dimensões dinâmicas: altura da imagem + área do botão
+        self._center(max(500, self.photo.width() + 40), self.photo.height() + 130)
+
     def _show_fallback(self):
         # Card de fallback estilizado e arredondado simulado
         card = tk.Frame(self, bg="#161B22", padx=20, pady=20,
@@ -1881,9 +6200,12 @@ class SplashWindow(tk.Tk):
 
 # ─────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
+    STARTUP.mark("módulo importado")
+
     def launch_main_app(open_url=False):
         app = TextMapperApp()
         if open_url:
+            import webbrowser
             app.after(600, lambda: webbrowser.open("https://www.image2url.com/r2/default/images/1780009830006-2f6b2d9d-2363-41ee-8455-f4d6f2916b54.png"))
         app.mainloop()
 